@@ -0,0 +1,312 @@
+import base64
+import collections
+import copy
+import datetime
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# /api/v1/namespaces/{namespace}/{plural}[/{name}] and /apis/{group}/{version}/namespaces/{namespace}/{plural}[/{name}]
+RESOURCE_PATH = re.compile(r"^/(?:api/v1|apis/[^/]+/[^/]+)/namespaces/(?P<namespace>[^/]+)/(?P<plural>[^/]+)"
+                           r"(?:/(?P<name>[^/]+))?$")
+
+KINDS = {
+    "pods": "Pod",
+    "configmaps": "ConfigMap",
+    "secrets": "Secret",
+    "services": "Service",
+    "deployments": "Deployment",
+    "statefulsets": "StatefulSet",
+    "ingresses": "Ingress",
+    "cronjobs": "CronJob",
+    "horizontalpodautoscalers": "HorizontalPodAutoscaler",
+}
+
+# Watch events kept per resource and namespace; older resourceVersions get a 410, like a compacted etcd.
+WATCH_HISTORY = 5000
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _merge_patch(target, patch):
+    """Apply a JSON merge patch (RFC 7386)."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = _merge_patch(result.get(key), value)
+    return result
+
+
+def _status(code, reason, message):
+    return {"kind": "Status", "apiVersion": "v1", "status": "Failure", "code": code, "reason": reason,
+            "message": message}
+
+
+class FakeKubernetes:
+    """In-memory object store with the list, watch, create, patch and delete semantics kaas-api relies on.
+
+    Creating a deployment also creates its pods in the Running phase, so status lookups have something to join.
+    """
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._objects = {}
+        self._events = {}
+        self._resource_version = 0
+
+    def _next_resource_version(self):
+        self._resource_version += 1
+        return str(self._resource_version)
+
+    def _record(self, plural, namespace, event_type, obj):
+        events = self._events.setdefault((plural, namespace), collections.deque(maxlen=WATCH_HISTORY))
+        events.append((int(obj["metadata"]["resourceVersion"]), event_type, obj))
+        self._lock.notify_all()
+
+    def _store(self, plural, namespace):
+        return self._objects.setdefault((plural, namespace), {})
+
+    def _put(self, plural, namespace, obj, event_type):
+        if plural == "secrets" and obj.get("stringData"):
+            # Like the API server, fold stringData into base64 encoded data.
+            data = dict(obj.get("data") or {})
+            data.update({key: base64.b64encode(value.encode()).decode() for key, value in obj.pop("stringData").items()})
+            obj["data"] = data
+        metadata = obj.setdefault("metadata", {})
+        metadata["namespace"] = namespace
+        metadata["resourceVersion"] = self._next_resource_version()
+        metadata.setdefault("uid", str(uuid.uuid4()))
+        metadata.setdefault("creationTimestamp", _now())
+        obj.setdefault("kind", KINDS.get(plural, "Object"))
+        self._store(plural, namespace)[metadata["name"]] = obj
+        self._record(plural, namespace, event_type, obj)
+        return obj
+
+    def _remove(self, plural, namespace, name):
+        obj = self._store(plural, namespace).pop(name, None)
+        if obj is not None:
+            obj = dict(obj, metadata=dict(obj["metadata"], resourceVersion=self._next_resource_version()))
+            self._record(plural, namespace, "DELETED", obj)
+        return obj
+
+    def _create_pods(self, deployment):
+        metadata = deployment["metadata"]
+        labels = deployment["spec"]["template"]["metadata"].get("labels", {"app": metadata["name"]})
+        containers = deployment["spec"]["template"]["spec"]["containers"]
+        for i in range(deployment["spec"].get("replicas") or 0):
+            pod = {
+                "apiVersion": "v1",
+                "metadata": {"name": f"{metadata['name']}-{uuid.uuid4().hex[:10]}", "labels": dict(labels)},
+                "spec": {"containers": containers},
+                "status": {
+                    "phase": "Running",
+                    "startTime": _now(),
+                    "containerStatuses": [
+                        {"name": container["name"], "image": container.get("image", ""), "imageID": "",
+                         "ready": True, "restartCount": 0, "state": {"running": {"startedAt": _now()}}}
+                        for container in containers
+                    ]
+                }
+            }
+            self._put("pods", metadata["namespace"], pod, "ADDED")
+
+    def _delete_pods(self, namespace, app_name):
+        for name, pod in list(self._store("pods", namespace).items()):
+            if pod["metadata"].get("labels", {}).get("app") == app_name:
+                self._remove("pods", namespace, name)
+
+    def seed_deployment(self, namespace, name, replicas=1, image="nginx:latest"):
+        self.create("deployments", namespace, {
+            "apiVersion": "apps/v1",
+            "metadata": {"name": name, "labels": {"app": name}},
+            "spec": {
+                "replicas": replicas,
+                "selector": {"matchLabels": {"app": name}},
+                "template": {
+                    "metadata": {"labels": {"app": name}},
+                    "spec": {"containers": [{"name": name, "image": image}]}
+                }
+            }
+        })
+
+    def create(self, plural, namespace, obj):
+        with self._lock:
+            name = obj["metadata"]["name"]
+            if name in self._store(plural, namespace):
+                return 409, _status(409, "AlreadyExists", f'{plural} "{name}" already exists')
+            obj = copy.deepcopy(obj)
+            if plural == "deployments":
+                replicas = obj["spec"].get("replicas") or 0
+                obj["status"] = {"replicas": replicas, "readyReplicas": replicas, "availableReplicas": replicas,
+                                 "updatedReplicas": replicas, "observedGeneration": 1}
+            obj = self._put(plural, namespace, obj, "ADDED")
+            if plural == "deployments":
+                self._create_pods(obj)
+            return 201, obj
+
+    def get(self, plural, namespace, name):
+        with self._lock:
+            obj = self._store(plural, namespace).get(name)
+            if obj is None:
+                return 404, _status(404, "NotFound", f'{plural} "{name}" not found')
+            return 200, obj
+
+    def patch(self, plural, namespace, name, patch):
+        with self._lock:
+            obj = self._store(plural, namespace).get(name)
+            if obj is None:
+                return 404, _status(404, "NotFound", f'{plural} "{name}" not found')
+            return 200, self._put(plural, namespace, _merge_patch(obj, patch), "MODIFIED")
+
+    def delete(self, plural, namespace, name):
+        with self._lock:
+            obj = self._remove(plural, namespace, name)
+            if obj is None:
+                return 404, _status(404, "NotFound", f'{plural} "{name}" not found')
+            if plural == "deployments":
+                self._delete_pods(namespace, name)
+            return 200, obj
+
+    def list(self, plural, namespace, limit=None, continue_token=None):
+        with self._lock:
+            items = sorted(self._store(plural, namespace).values(), key=lambda obj: obj["metadata"]["name"])
+            resource_version = str(self._resource_version)
+        offset = 0
+        if continue_token:
+            if not continue_token.isdigit():
+                return 410, _status(410, "Expired", "the provided continue parameter is too old")
+            offset = int(continue_token)
+        remaining = None
+        if limit:
+            end = offset + limit
+            remaining = str(end) if end < len(items) else None
+            items = items[offset:end]
+        else:
+            items = items[offset:]
+        return 200, {
+            "kind": KINDS.get(plural, "Object") + "List",
+            "apiVersion": "v1",
+            "metadata": {"resourceVersion": resource_version, "continue": remaining},
+            "items": items
+        }
+
+    def watch(self, plural, namespace, resource_version, timeout):
+        """Yield watch events after ``resource_version`` until ``timeout`` seconds have passed."""
+        deadline = time.monotonic() + timeout
+        last = int(resource_version or 0)
+        while True:
+            with self._lock:
+                events = self._events.get((plural, namespace), ())
+                if len(events) == WATCH_HISTORY and events[0][0] > last + 1:
+                    yield {"type": "ERROR", "object": _status(410, "Expired", "too old resource version")}
+                    return
+                pending = [(rv, event_type, obj) for rv, event_type, obj in events if rv > last]
+                if not pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    self._lock.wait(remaining)
+                    continue
+            for rv, event_type, obj in pending:
+                last = rv
+                yield {"type": event_type, "object": obj}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _route(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        match = RESOURCE_PATH.match(url.path)
+        return url, parse_qs(url.query), match
+
+    def do_GET(self):
+        url, query, match = self._route()
+        kube = self.server.kube
+        if url.path.rstrip("/") == "/version":
+            return self._send(200, {"major": "1", "minor": "29", "gitVersion": "v1.29.0-fake", "gitCommit": "",
+                                    "gitTreeState": "clean", "buildDate": _now(), "goVersion": "go1.21",
+                                    "compiler": "gc", "platform": "linux/amd64"})
+        if url.path.rstrip("/") == "/api/v1":
+            return self._send(200, {"kind": "APIResourceList", "groupVersion": "v1", "resources": []})
+        if match is None:
+            return self._send(404, _status(404, "NotFound", url.path))
+        plural, namespace, name = match.group("plural"), match.group("namespace"), match.group("name")
+        if name:
+            return self._send(*kube.get(plural, namespace, name))
+        if query.get("watch", ["false"])[0] in ("true", "1"):
+            return self._watch(plural, namespace, query)
+        limit = int(query["limit"][0]) if "limit" in query else None
+        return self._send(*kube.list(plural, namespace, limit, query.get("continue", [None])[0]))
+
+    def _watch(self, plural, namespace, query):
+        timeout = float(query.get("timeoutSeconds", ["60"])[0])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for event in self.server.kube.watch(plural, namespace, query.get("resourceVersion", [None])[0], timeout):
+                line = json.dumps(event).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def do_POST(self):
+        url, query, match = self._route()
+        if match is None or match.group("name"):
+            return self._send(404, _status(404, "NotFound", url.path))
+        self._send(*self.server.kube.create(match.group("plural"), match.group("namespace"), self._body()))
+
+    def do_PATCH(self):
+        url, query, match = self._route()
+        if match is None or not match.group("name"):
+            return self._send(404, _status(404, "NotFound", url.path))
+        self._send(*self.server.kube.patch(match.group("plural"), match.group("namespace"), match.group("name"),
+                                           self._body()))
+
+    def do_DELETE(self):
+        url, query, match = self._route()
+        self._body()
+        if match is None or not match.group("name"):
+            return self._send(404, _status(404, "NotFound", url.path))
+        self._send(*self.server.kube.delete(match.group("plural"), match.group("namespace"), match.group("name")))
+
+
+def serve(kube, host="127.0.0.1", port=0, latency=0.0):
+    """Serve ``kube`` over HTTP in a background thread and return the server; ``server.server_port`` is the port."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.kube = kube
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, name="fake-kube", daemon=True).start()
+    return server
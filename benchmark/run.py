@@ -0,0 +1,280 @@
+"""Load test kaas-api offline, against an in-process fake Kubernetes API server.
+
+Starts the app with uvicorn, pointed at the fake API server through a generated kubeconfig, seeds
+namespaces with deployments and pods, then drives a weighted mix of ``POST /applications``,
+``GET /deployments/{namespace}`` and ``GET /health/{app_name}`` at a fixed concurrency.
+Throughput and p50/p95/p99 latency per endpoint are printed and written as JSON to ``--output``.
+
+Health lookups and the operation queue behind ``POST /applications`` need Postgres: pass
+``--db-host`` (for example a throwaway ``docker run -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgres``).
+Without it the db-config ConfigMap points at a closed port, so health lookups fail fast and answer
+"unhealthy", which under-states their cost, and ``POST /applications`` fails.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import fake_kube
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ("applications", "deployments", "health")
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--namespaces", type=int, default=2, help="namespaces to seed")
+    parser.add_argument("--deployments", type=int, default=100, help="deployments per namespace")
+    parser.add_argument("--pods", type=int, default=2, help="pods per deployment")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds to run before measuring")
+    parser.add_argument("--mix", default="applications=1,deployments=4,health=8",
+                        help="relative endpoint weights, as endpoint=weight pairs")
+    parser.add_argument("--deployments-page-size", type=int, default=0,
+                        help="read /deployments in pages of this size instead of all at once")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (KAAS_WORKERS)")
+    parser.add_argument("--api-latency-ms", type=float, default=2, help="latency added to each fake API call")
+    parser.add_argument("--db-host", help="Postgres host for the db-config ConfigMap")
+    parser.add_argument("--db-port", default="5432")
+    parser.add_argument("--db-name", default="postgres")
+    parser.add_argument("--db-user", default="postgres")
+    parser.add_argument("--db-password", default="postgres")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, may be repeated")
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the JSON results")
+    return parser.parse_args()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _write_kubeconfig(directory, port):
+    path = os.path.join(directory, "kubeconfig")
+    with open(path, "w") as f:
+        json.dump({
+            "apiVersion": "v1",
+            "kind": "Config",
+            "clusters": [{"name": "fake", "cluster": {"server": f"http://127.0.0.1:{port}"}}],
+            "users": [{"name": "fake", "user": {"token": "benchmark"}}],
+            "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake"}}],
+            "current-context": "fake"
+        }, f)
+    return path
+
+
+def _seed(kube, args):
+    db_config = {
+        "DB_HOST": args.db_host or "127.0.0.1",
+        "DB_HOST_SLAVE": args.db_host or "127.0.0.1",
+        "DB_PORT": args.db_port if args.db_host else str(_free_port()),
+        "DB_NAME": args.db_name,
+        "DB_USER": args.db_user,
+        "DB_PASSWORD": args.db_password
+    }
+    kube.create("configmaps", "default", {"metadata": {"name": "db-config"}, "data": db_config})
+    kube.seed_deployment("default", "kaas-api")
+    apps = []
+    for n in range(args.namespaces):
+        namespace = f"bench-{n}"
+        for d in range(args.deployments):
+            name = f"{namespace}-app-{d}"
+            kube.seed_deployment(namespace, name, replicas=args.pods)
+            apps.append(name)
+    return apps
+
+
+def _start_app(args, kubeconfig, directory, port):
+    env = dict(os.environ, KUBECONFIG=kubeconfig, KAAS_WORKERS=str(args.workers), SINGLETON_LOCK_DIR=directory,
+               HEALTH_PROBER_ENABLED="false", HEALTH_REPORT_FLUSH_SECONDS="1", DEPENDENCY_CHECK_INTERVAL_SECONDS="1")
+    if args.workers > 1:
+        env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(directory, "metrics")
+        os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    log = open(os.path.join(directory, "app.log"), "w")
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                             "--workers", str(args.workers), "--log-level", "warning"],
+                            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def _wait_until_started(http, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("kaas-api exited during startup, see app.log")
+        try:
+            if (await http.get("/startup")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("kaas-api did not start in time")
+
+
+def _application(n):
+    return {
+        "AppName": f"bench-new-{os.getpid()}-{n}",
+        "Monitor": "true",
+        "Replicas": 1,
+        "ImageAddress": "nginx",
+        "ImageTag": "latest",
+        "DomainAddress": f"bench-new-{n}.example.com",
+        "ServicePort": 80,
+        "Resources": {"CPU": "100m", "RAM": "128Mi"},
+        "Envs": [{"Key": "MODE", "Value": "bench", "IsSecret": False},
+                 {"Key": "TOKEN", "Value": "secret", "IsSecret": True}]
+    }
+
+
+class _Load:
+    """Weighted request mix; records latency and status per endpoint."""
+
+    def __init__(self, http, args, apps):
+        self.http = http
+        self.args = args
+        self.apps = apps
+        self.counter = 0
+        weights = dict((pair.split("=")[0], float(pair.split("=")[1])) for pair in args.mix.split(","))
+        unknown = set(weights) - set(ENDPOINTS)
+        if unknown:
+            raise SystemExit(f"unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+        self.endpoints = [endpoint for endpoint in ENDPOINTS if weights.get(endpoint)]
+        self.weights = [weights[endpoint] for endpoint in self.endpoints]
+        self.samples = {endpoint: [] for endpoint in self.endpoints}
+        self.statuses = {endpoint: {} for endpoint in self.endpoints}
+
+    async def _request(self, endpoint):
+        if endpoint == "applications":
+            self.counter += 1
+            return await self.http.post("/applications", json=_application(self.counter))
+        if endpoint == "deployments":
+            namespace = f"bench-{random.randrange(self.args.namespaces)}"
+            params = {"limit": self.args.deployments_page_size} if self.args.deployments_page_size else None
+            return await self.http.get(f"/deployments/{namespace}", params=params)
+        return await self.http.get(f"/health/{random.choice(self.apps)}")
+
+    async def _worker(self, until, record):
+        while time.monotonic() < until:
+            endpoint = random.choices(self.endpoints, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                status = (await self._request(endpoint)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            if record:
+                self.samples[endpoint].append((elapsed, status))
+                self.statuses[endpoint][str(status)] = self.statuses[endpoint].get(str(status), 0) + 1
+
+    async def run(self, seconds, record):
+        until = time.monotonic() + seconds
+        await asyncio.gather(*(self._worker(until, record) for _ in range(self.args.concurrency)))
+
+
+def _percentile(values, q):
+    """Nearest-rank percentile of sorted ``values``."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+def _summarize(samples, statuses, duration):
+    latencies = sorted(elapsed for elapsed, _ in samples)
+    errors = sum(1 for _, status in samples if not isinstance(status, int) or status >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": len(samples) / duration,
+        "latency_seconds": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None
+        },
+        "statuses": statuses
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_table(endpoints):
+    print(f"{'endpoint':<14}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, result in endpoints.items():
+        latency = result["latency_seconds"]
+        ms = [f"{latency[q] * 1000:.1f}" if latency[q] is not None else "-" for q in ("p50", "p95", "p99")]
+        print(f"{endpoint:<14}{result['requests']:>10}{result['errors']:>8}{result['throughput_rps']:>10.1f}"
+              f"{ms[0]:>10}{ms[1]:>10}{ms[2]:>10}")
+
+
+async def _benchmark(http, args, apps):
+    # Seed a health row for every app, then give the report buffer time to flush.
+    for start in range(0, len(apps), 500):
+        await http.post("/health/reports", json=[{"AppName": app, "Healthy": True} for app in apps[start:start + 500]])
+    await asyncio.sleep(2)
+    load = _Load(http, args, apps)
+    if args.warmup:
+        await load.run(args.warmup, record=False)
+    started = time.monotonic()
+    await load.run(args.duration, record=True)
+    duration = time.monotonic() - started
+    endpoints = {endpoint: _summarize(load.samples[endpoint], load.statuses[endpoint], duration)
+                 for endpoint in load.endpoints}
+    return endpoints, duration
+
+
+async def _main(args):
+    kube = fake_kube.FakeKubernetes()
+    apps = _seed(kube, args)
+    server = fake_kube.serve(kube, latency=args.api_latency_ms / 1000)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    with tempfile.TemporaryDirectory(prefix="kaas-bench-") as directory:
+        port = _free_port()
+        process = _start_app(args, _write_kubeconfig(directory, server.server_port), directory, port)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as http:
+                await _wait_until_started(http, process)
+                endpoints, duration = await _benchmark(http, args, apps)
+        except Exception:
+            with open(os.path.join(directory, "app.log")) as log:
+                sys.stderr.write(log.read())
+            raise
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            server.shutdown()
+
+    results = {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("db_password", "output")},
+        "duration_seconds": duration,
+        "endpoints": endpoints
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    _print_table(endpoints)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(_parse_args()))
@@ -1,21 +1,78 @@
+import asyncio
+import base64
+import collections
+import contextvars
+import datetime
+import fcntl
+import functools
+import glob
+import hashlib
+import json
 import logging
+import math
+import os
+import queue
+import random
+import re
+import shutil
+import signal
+import sys
+import threading
+import uuid
+from contextlib import asynccontextmanager, contextmanager, ExitStack
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import orjson
 import psycopg2
-from fastapi import FastAPI, HTTPException, Request, Response
-from prometheus_client import Counter, generate_latest, Gauge
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.routing import Match
+from prometheus_client import CollectorRegistry, Counter, generate_latest, Gauge, Histogram, multiprocess
 import time
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from typing import List, Literal, Optional, Union
 
-from kubernetes import client, config
+from kubernetes import client, config, watch
 from kubernetes.client import ApiException, V1Deployment
+from kubernetes.utils import parse_quantity
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-config.load_incluster_config()
-logger.info("load incluster config passed")
-
-app = FastAPI()
+try:
+    config.load_incluster_config()
+    logger.info("load incluster config passed")
+except config.ConfigException:
+    # Outside a cluster (local runs, the benchmark harness) use the kubeconfig from KUBECONFIG instead.
+    config.load_kube_config()
+    logger.info("load kube config passed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PROMETHEUS_MULTIPROC_DIR:
+        _mark_dead_workers()
+    threading.Thread(target=_bootstrap_health_status_table, name="health-status-bootstrap", daemon=True).start()
+    _dependency_monitor.start()
+    _health_reports.start()
+    _operation_workers.start()
+    _trace_exporter.start()
+    prober = None
+    if HEALTH_PROBER_ENABLED:
+        prober = asyncio.ensure_future(_run_as_singleton("prober", _HealthProber(PROBER_NAMESPACE).run))
+    yield
+    await _operation_workers.stop()
+    if prober is not None:
+        prober.cancel()
+        await asyncio.gather(prober, return_exceptions=True)
+    await asyncio.get_running_loop().run_in_executor(None, _health_reports.stop)
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 class EnvVar(BaseModel):
@@ -24,62 +81,844 @@ class EnvVar(BaseModel):
     IsSecret: bool
 
 
+class ScalingBehavior(BaseModel):
+    StabilizationWindowSeconds: Optional[int] = Field(None, ge=0, le=3600)
+    MaxPodsPerPeriod: Optional[int] = Field(None, ge=1)
+    MaxPercentPerPeriod: Optional[int] = Field(None, ge=1)
+    PeriodSeconds: int = Field(60, ge=1, le=1800)
+
+
+class AutoscalingSpec(BaseModel):
+    MinReplicas: int = Field(1, ge=1)
+    MaxReplicas: int = Field(..., ge=1)
+    TargetCPUUtilization: Optional[int] = Field(80, ge=1)
+    TargetMemoryUtilization: Optional[int] = Field(None, ge=1)
+    ScaleUp: Optional[ScalingBehavior] = None
+    ScaleDown: Optional[ScalingBehavior] = None
+
+    @model_validator(mode="after")
+    def check_bounds_and_targets(self):
+        if self.MinReplicas > self.MaxReplicas:
+            raise ValueError(f"MinReplicas {self.MinReplicas} is above MaxReplicas {self.MaxReplicas}")
+        if not self.TargetCPUUtilization and not self.TargetMemoryUtilization:
+            raise ValueError("a CPU or memory utilization target is needed")
+        return self
+
+
+PodPhase = Literal["Pending", "Running", "Succeeded", "Failed", "Unknown"]
+
+
 class AppData(BaseModel):
     AppName: str
     Monitor: str
     Replicas: Optional[int] = 1
+    Autoscaling: Optional[AutoscalingSpec] = None
     ImageAddress: str
     ImageTag: str
     DomainAddress: Optional[str] = None
     ServicePort: int
     Resources: dict
     Envs: List[EnvVar]
+    MonitorInterval: Optional[float] = None
+    MonitorTimeout: Optional[float] = None
+
+
+class HealthReport(BaseModel):
+    AppName: str
+    Healthy: bool
+    Timestamp: Optional[datetime.datetime] = None
 
 
 class PostgresAppData(BaseModel):
     AppName: str
     Resources: dict
     External: Optional[bool] = False
-
-
-# Prometheus metrics
+    Profile: Literal["web", "oltp", "dw", "mixed"] = "mixed"
+    Storage: Optional[str] = None
+    StorageClass: Optional[str] = None
+    PgBouncer: Optional[bool] = False
+
+    @model_validator(mode="after")
+    def check_quantities(self):
+        # The tuning is computed from these, so bad values must be rejected before the operation is queued.
+        quantities = [(f"Resources.{key}", self.Resources.get(key)) for key in ("cpu", "memory")]
+        if self.Storage is not None:
+            quantities.append(("Storage", self.Storage))
+        for name, value in quantities:
+            if value is None:
+                raise ValueError(f"{name} is required")
+            try:
+                quantity = parse_quantity(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} {value!r} is not a Kubernetes quantity")
+            if quantity <= 0:
+                raise ValueError(f"{name} must be positive")
+        return self
+
+
+# Serving settings; with more than one worker, metrics go through prometheus_client multiprocess mode
+KAAS_WORKERS = int(os.getenv("KAAS_WORKERS", "1"))
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+SINGLETON_LOCK_DIR = os.getenv("SINGLETON_LOCK_DIR", "/tmp")
+
+# Dependency monitor settings behind /ready and /startup
+DEPENDENCY_CHECK_INTERVAL_SECONDS = float(os.getenv("DEPENDENCY_CHECK_INTERVAL_SECONDS", "10"))
+DEPENDENCY_CHECK_TIMEOUT_SECONDS = float(os.getenv("DEPENDENCY_CHECK_TIMEOUT_SECONDS", "3"))
+DEPENDENCY_FAILURE_THRESHOLD = int(os.getenv("DEPENDENCY_FAILURE_THRESHOLD", "3"))
+DEPENDENCY_STALENESS_SECONDS = float(os.getenv("DEPENDENCY_STALENESS_SECONDS", "60"))
+READINESS_DEPENDENCIES = os.getenv("READINESS_DEPENDENCIES", "api_server").split(",")
+
+# Histogram buckets in seconds, as comma separated lists
+METRICS_LATENCY_BUCKETS = [float(bucket) for bucket in os.getenv(
+    "METRICS_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(",")]
+METRICS_DB_LATENCY_BUCKETS = [float(bucket) for bucket in os.getenv(
+    "METRICS_DB_LATENCY_BUCKETS", "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5").split(",")]
+
+# Prometheus metrics; request metrics are labelled by route template, e.g. /health/{app_name}
 REQUEST_COUNT = Counter("num_requests", "Total number of requests", ['path'])
 FAILED_REQUEST_COUNT = Counter("num_failed_requests", "Total number of failed requests", ['path'])
-RESPONSE_TIME = Gauge("response_time", "Response time in seconds", ['path'])
+RESPONSE_TIME = Histogram("response_time_seconds", "Response time in seconds", ['path'],
+                          buckets=METRICS_LATENCY_BUCKETS)
+REQUESTS_IN_PROGRESS = Gauge("requests_in_progress", "Number of requests being handled", ['path'],
+                             multiprocess_mode='livesum')
 DB_ERROR_COUNT = Counter("num_db_errors", "Total number of database errors", ['path'])
-DB_RESPONSE_TIME = Gauge("db_response_time", "Database response time in seconds", ['path'])
+DB_RESPONSE_TIME = Histogram("db_response_time_seconds", "Database response time in seconds", ['path'],
+                             buckets=METRICS_DB_LATENCY_BUCKETS)
+INFORMER_EVENT_COUNT = Counter("num_informer_events", "Total number of watch events applied to the informer cache",
+                               ['resource', 'type'])
+INFORMER_RELIST_COUNT = Counter("num_informer_relists", "Total number of full relists done by the informer cache",
+                                ['resource'])
+DB_POOL_SIZE = Gauge("db_pool_size", "Number of connections the database pool may open", ['pool'],
+                     multiprocess_mode='livesum')
+DB_POOL_IN_USE = Gauge("db_pool_in_use", "Number of database connections currently checked out", ['pool'],
+                       multiprocess_mode='livesum')
+DB_POOL_WAIT_TIME = Histogram("db_pool_wait_time_seconds", "Time spent waiting for a free pooled connection in seconds",
+                              ['pool'], buckets=METRICS_DB_LATENCY_BUCKETS)
+DB_POOL_CHECKOUT_TIME = Histogram("db_pool_checkout_time_seconds", "Time a pooled connection was held in seconds",
+                                  ['pool'], buckets=METRICS_DB_LATENCY_BUCKETS)
+
+# Database pool settings
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "5"))
+
+APPLY_RESULT_COUNT = Counter("num_applied_objects", "Total number of objects applied, by outcome",
+                             ['kind', 'result'])
+
+# Informer cache settings
+INFORMER_WATCH_TIMEOUT_SECONDS = int(os.getenv("INFORMER_WATCH_TIMEOUT_SECONDS", "60"))
+INFORMER_RESYNC_SECONDS = int(os.getenv("INFORMER_RESYNC_SECONDS", "300"))
+INFORMER_SYNC_TIMEOUT_SECONDS = float(os.getenv("INFORMER_SYNC_TIMEOUT_SECONDS", "10"))
+INFORMER_EVENT_HISTORY = int(os.getenv("INFORMER_EVENT_HISTORY", "1000"))
+INFORMER_MAX_NAMESPACES = int(os.getenv("INFORMER_MAX_NAMESPACES", "50"))
+INFORMER_ERROR_CACHE_SECONDS = float(os.getenv("INFORMER_ERROR_CACHE_SECONDS", "30"))
+
+# Deployment event stream settings; SSE_SUBSCRIBER_BUFFER is the number of events a slow client may fall behind
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", "1000"))
+SSE_SUBSCRIBER_BUFFER = int(os.getenv("SSE_SUBSCRIBER_BUFFER", "1000"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+SSE_SUBSCRIBERS = Gauge("deployment_event_subscribers", "Number of clients streaming deployment events",
+                        multiprocess_mode='livesum')
+
+PROBE_COUNT = Counter("num_health_probes", "Total number of health probes done by the prober", ['result'])
+PROBE_RESPONSE_TIME = Histogram("health_probe_response_time_seconds", "Health probe response time in seconds",
+                                buckets=METRICS_LATENCY_BUCKETS)
+PROBER_TARGETS = Gauge("health_prober_targets", "Number of applications the prober is monitoring",
+                       multiprocess_mode='livemax')
+HEALTH_REPORT_COUNT = Counter("num_health_reports", "Total number of health results added to the report buffer")
+HEALTH_REPORT_BUFFER_DEPTH = Gauge("health_report_buffer_depth", "Number of applications with unflushed health results",
+                                   multiprocess_mode='livesum')
+HEALTH_REPORT_FLUSH_LAG = Gauge("health_report_flush_lag_seconds",
+                                "Age of the oldest health result written by the last flush",
+                                multiprocess_mode='livemax')
+
+# Health check settings; HEALTH_CHECK_MODE=cronjob keeps the legacy per-app CronJob
+HEALTH_CHECK_MODE = os.getenv("HEALTH_CHECK_MODE", "prober")
+HEALTH_PROBER_ENABLED = os.getenv("HEALTH_PROBER_ENABLED", "false") == "true"
+PROBER_NAMESPACE = os.getenv("PROBER_NAMESPACE", "default")
+PROBER_DEFAULT_INTERVAL_SECONDS = float(os.getenv("PROBER_DEFAULT_INTERVAL_SECONDS", "30"))
+PROBER_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("PROBER_DEFAULT_TIMEOUT_SECONDS", "2"))
+PROBER_JITTER = float(os.getenv("PROBER_JITTER", "0.1"))
+PROBER_MAX_CONCURRENCY = int(os.getenv("PROBER_MAX_CONCURRENCY", "100"))
+PROBER_DISCOVERY_SECONDS = float(os.getenv("PROBER_DISCOVERY_SECONDS", "15"))
+HEALTH_REPORT_FLUSH_SECONDS = float(os.getenv("HEALTH_REPORT_FLUSH_SECONDS", "5"))
+
+# Health history settings
+HEALTH_HISTORY_ROLLUP_SECONDS = float(os.getenv("HEALTH_HISTORY_ROLLUP_SECONDS", "60"))
+HEALTH_HISTORY_ROLLUP_DELAY_SECONDS = int(os.getenv("HEALTH_HISTORY_ROLLUP_DELAY_SECONDS", "120"))
+HEALTH_HISTORY_RAW_RETENTION_DAYS = int(os.getenv("HEALTH_HISTORY_RAW_RETENTION_DAYS", "2"))
+HEALTH_HISTORY_1M_RETENTION_DAYS = int(os.getenv("HEALTH_HISTORY_1M_RETENTION_DAYS", "14"))
+HEALTH_HISTORY_1H_RETENTION_DAYS = int(os.getenv("HEALTH_HISTORY_1H_RETENTION_DAYS", "400"))
+HEALTH_HISTORY_MAX_BUFFERED = int(os.getenv("HEALTH_HISTORY_MAX_BUFFERED", "100000"))
+
+# Annotations that register a deployment with the health prober
+MONITOR_ANNOTATION = "kaas/monitor"
+MONITOR_PORT_ANNOTATION = "kaas/monitor-port"
+MONITOR_INTERVAL_ANNOTATION = "kaas/monitor-interval"
+MONITOR_TIMEOUT_ANNOTATION = "kaas/monitor-timeout"
+
+# Health lookup settings
+HEALTH_CACHE_TTL_SECONDS = float(os.getenv("HEALTH_CACHE_TTL_SECONDS", "2"))
+HEALTH_BULK_MAX_APPS = int(os.getenv("HEALTH_BULK_MAX_APPS", "500"))
+
+# Batch onboarding settings
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+BATCH_MAX_QPS = float(os.getenv("BATCH_MAX_QPS", "20"))
+
+BATCH_RECORD_COUNT = Counter("num_batch_records", "Total number of batch onboarding records, by outcome", ['result'])
+
+# Read routing; reads go to DB_HOST_SLAVE only while it is at most this far behind the master
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+
+DB_HOST_UP = Gauge("db_host_up", "Whether the last check of the database host succeeded", ['role'],
+                   multiprocess_mode='livemin')
+DB_REPLICA_LAG = Gauge("db_replica_lag_seconds", "Replication lag of the slave host in seconds",
+                       multiprocess_mode='livemax')
+DB_READ_ROUTE_COUNT = Counter("num_db_read_routes", "Total number of read queries, by the host they were sent to",
+                              ['target', 'reason'])
+
+# Admission control for expensive reads; CLIENT_ID_HEADER (e.g. X-Forwarded-For) identifies
+# clients behind a proxy, otherwise the peer address is used
+READ_MAX_CONCURRENCY = int(os.getenv("READ_MAX_CONCURRENCY", "64"))
+READ_MAX_CONCURRENCY_PER_CLIENT = int(os.getenv("READ_MAX_CONCURRENCY_PER_CLIENT", "8"))
+READ_RETRY_AFTER_SECONDS = int(os.getenv("READ_RETRY_AFTER_SECONDS", "1"))
+CLIENT_ID_HEADER = os.getenv("CLIENT_ID_HEADER", "")
+
+ADMISSION_REJECTED_COUNT = Counter("num_admission_rejected_requests",
+                                   "Total number of reads rejected with 429, by the limit that was hit",
+                                   ['path', 'scope'])
+COALESCED_READ_COUNT = Counter("num_coalesced_reads", "Total number of reads answered by another in-flight read",
+                               ['path'])
+
+# Self-service Postgres settings
+PGBOUNCER_IMAGE = os.getenv("PGBOUNCER_IMAGE", "edoburu/pgbouncer:latest")
+PGBOUNCER_MAX_CLIENT_CONN = int(os.getenv("PGBOUNCER_MAX_CLIENT_CONN", "1000"))
+
+# Operation queue settings; OPERATION_WORKERS is per process
+OPERATION_WORKERS = int(os.getenv("OPERATION_WORKERS", "4"))
+OPERATION_MAX_ATTEMPTS = int(os.getenv("OPERATION_MAX_ATTEMPTS", "5"))
+OPERATION_RETRY_BACKOFF_SECONDS = float(os.getenv("OPERATION_RETRY_BACKOFF_SECONDS", "5"))
+OPERATION_RETRY_MAX_BACKOFF_SECONDS = float(os.getenv("OPERATION_RETRY_MAX_BACKOFF_SECONDS", "300"))
+OPERATION_LEASE_SECONDS = int(os.getenv("OPERATION_LEASE_SECONDS", "300"))
+OPERATION_POLL_SECONDS = float(os.getenv("OPERATION_POLL_SECONDS", "2"))
+OPERATION_RETENTION_DAYS = int(os.getenv("OPERATION_RETENTION_DAYS", "7"))
+
+OPERATION_COUNT = Counter("num_operations", "Total number of provisioning operations, by outcome", ['kind', 'result'])
+OPERATION_QUEUE_WAIT = Histogram("operation_queue_wait_seconds",
+                                 "Time operations waited in the queue before their first attempt in seconds",
+                                 ['kind'], buckets=METRICS_LATENCY_BUCKETS)
+
+# Tracing settings; finished traces go to TRACE_EXPORT_FILE (JSON lines) and/or an OTLP/HTTP collector
+# at TRACE_OTLP_ENDPOINT, and any trace longer than TRACE_SLOW_REQUEST_SECONDS is logged (0 turns that off)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true") == "true"
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "kaas-api")
+TRACE_EXPORT_QUEUE_SIZE = int(os.getenv("TRACE_EXPORT_QUEUE_SIZE", "1000"))
+TRACE_SLOW_REQUEST_SECONDS = float(os.getenv("TRACE_SLOW_REQUEST_SECONDS", "5"))
+
+TRACE_DROPPED_COUNT = Counter("num_dropped_traces", "Total number of traces not exported because the queue was full")
+
+# Kubernetes API client settings
+K8S_CONNECTION_POOL_SIZE = int(os.getenv("K8S_CONNECTION_POOL_SIZE", "32"))
+K8S_CONNECT_TIMEOUT_SECONDS = float(os.getenv("K8S_CONNECT_TIMEOUT_SECONDS", "5"))
+K8S_READ_TIMEOUT_SECONDS = float(os.getenv("K8S_READ_TIMEOUT_SECONDS", "30"))
+
+K8S_REQUEST_TIME = Histogram("k8s_request_duration_seconds", "Kubernetes API server call duration in seconds",
+                             ['verb', 'resource', 'code'], buckets=METRICS_LATENCY_BUCKETS)
+
+
+# OTLP span kinds
+_SPAN_INTERNAL, _SPAN_SERVER, _SPAN_CLIENT, _SPAN_CONSUMER = 1, 2, 3, 5
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class _Span:
+    """One timed step of a trace; children are the spans started while it was the current one."""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "_start",
+                 "duration", "error", "children")
+
+    def __init__(self, name, kind, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.children = []
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children]
+        }
+
+
+@contextmanager
+def _enter_span(span):
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.finish()
+        _current_span.reset(token)
+
+
+@contextmanager
+def _span(name, kind=_SPAN_INTERNAL, **attributes):
+    """Time the block as a child of the current span; outside a trace this does nothing and yields None."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    span = _Span(name, kind, parent.trace_id, parent.span_id, attributes)
+    parent.children.append(span)
+    with _enter_span(span):
+        yield span
+
+
+@contextmanager
+def _trace(name, kind=_SPAN_SERVER, traceparent=None, **attributes):
+    """Root span of a request or operation, continuing the trace in a W3C ``traceparent`` when given.
+
+    The finished trace is exported, and logged as a span tree when it took longer than ``TRACE_SLOW_REQUEST_SECONDS``.
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    match = _TRACEPARENT.match(traceparent or "")
+    if match and match.group(1) != "0" * 32:
+        span = _Span(name, kind, match.group(1), match.group(2), attributes)
+    else:
+        span = _Span(name, kind, os.urandom(16).hex(), None, attributes)
+    try:
+        with _enter_span(span):
+            yield span
+    finally:
+        if TRACE_SLOW_REQUEST_SECONDS and span.duration > TRACE_SLOW_REQUEST_SECONDS:
+            logger.warning(f"slow trace {span.trace_id}:\n" + "\n".join(_format_span_tree(span)))
+        _trace_exporter.export(span)
+
+
+def _traced(func):
+    """Run every call of ``func`` in a span named after it."""
+    name = func.__name__.lstrip("_")
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _span(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _current_traceparent():
+    span = _current_span.get()
+    return span.traceparent() if span is not None else None
+
+
+def _in_context(func, *args):
+    """``func`` bound to a copy of the current context; run_in_executor does not carry the current span over."""
+    return functools.partial(contextvars.copy_context().run, func, *args)
+
+
+def _format_span_tree(span, depth=0):
+    line = f"{'  ' * depth}{span.name} {span.duration * 1000 if span.duration is not None else 0:.1f}ms"
+    if span.attributes:
+        line += " " + " ".join(f"{key}={value}" for key, value in span.attributes.items())
+    if span.error:
+        line += f" error={span.error}"
+    lines = [line]
+    for child in list(span.children):
+        lines.extend(_format_span_tree(child, depth + 1))
+    return lines
+
+
+def _otlp_spans(span):
+    end_ns = span.start_ns + int((span.duration or 0) * 1e9)
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": [{"key": key, "value": {"stringValue": str(value)}} for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {}
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    spans = [otlp]
+    for child in list(span.children):
+        spans.extend(_otlp_spans(child))
+    return spans
+
+
+class _TraceExporter:
+    """Exports finished traces from a background thread, so requests never wait on the file or the collector.
+
+    Traces are queued up to ``TRACE_EXPORT_QUEUE_SIZE``; beyond that they are dropped and counted.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(TRACE_EXPORT_QUEUE_SIZE)
+        self._thread = None
+
+    def start(self):
+        if not (TRACE_EXPORT_FILE or TRACE_OTLP_ENDPOINT) or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span):
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            TRACE_DROPPED_COUNT.inc()
+
+    def _run(self):
+        with httpx.Client(timeout=5) as http:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < 100:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    self._write(http, batch)
+                except Exception as e:
+                    logger.error(f"tracing: failed to export {len(batch)} traces because {e}")
+
+    @staticmethod
+    def _write(http, batch):
+        if TRACE_EXPORT_FILE:
+            with open(TRACE_EXPORT_FILE, "ab") as f:
+                f.write(b"".join(orjson.dumps(span.to_dict()) + b"\n" for span in batch))
+        if TRACE_OTLP_ENDPOINT:
+            spans = [otlp for span in batch for otlp in _otlp_spans(span)]
+            payload = {"resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "kaas-api"}, "spans": spans}]
+            }]}
+            response = http.post(TRACE_OTLP_ENDPOINT.rstrip("/") + "/v1/traces", content=orjson.dumps(payload),
+                                 headers={"Content-Type": "application/json"})
+            response.raise_for_status()
+
+
+_trace_exporter = _TraceExporter()
+
+
+def _k8s_verb_and_resource(method, url, query_params=None):
+    """Kubernetes verb and resource of an API URL, e.g. ``list``/``pods`` for GET .../namespaces/x/pods."""
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    # Older clients pass the query string separately from the URL.
+    for key, value in query_params or ():
+        query.setdefault(key, []).append(str(value).lower())
+    parts = [part for part in parsed.path.split("/") if part]
+    # /api/v1/... or /apis/<group>/<version>/...
+    parts = parts[2:] if parts[:1] == ["api"] else parts[3:]
+    if len(parts) >= 3 and parts[0] == "namespaces":
+        parts = parts[2:]
+    resource = parts[0] if parts else "discovery"
+    named = len(parts) >= 2
+    if method == "GET":
+        if query.get("watch") in (["true"], ["1"]):
+            verb = "watch"
+        else:
+            verb = "get" if named or resource == "discovery" else "list"
+    else:
+        verb = {"POST": "create", "PUT": "update", "PATCH": "patch", "DELETE": "delete"}.get(method, method.lower())
+    return verb, resource
+
+
+def _instrument_api_client(api_client):
+    """Record every API server call in K8S_REQUEST_TIME and give calls without a timeout the default one."""
+    request = api_client.rest_client.request
+
+    def timed_request(method, url, *args, **kwargs):
+        verb, resource = _k8s_verb_and_resource(method, url, kwargs.get("query_params"))
+        if kwargs.get("_request_timeout") is None:
+            # Watches are held open by the server, so only the connect phase gets a timeout.
+            read_timeout = None if verb == "watch" else K8S_READ_TIMEOUT_SECONDS
+            kwargs["_request_timeout"] = (K8S_CONNECT_TIMEOUT_SECONDS, read_timeout)
+        start_time = time.perf_counter()
+        code = "error"
+        with _span(f"k8s {verb} {resource}", _SPAN_CLIENT) as span:
+            try:
+                response = request(method, url, *args, **kwargs)
+                code = str(response.status)
+                return response
+            except ApiException as e:
+                code = str(e.status)
+                raise
+            finally:
+                K8S_REQUEST_TIME.labels(verb=verb, resource=resource, code=code).observe(
+                    time.perf_counter() - start_time)
+                if span is not None:
+                    span.attributes["code"] = code
+
+    api_client.rest_client.request = timed_request
+    return api_client
+
+
+# One API client, and so one keep-alive connection pool, shared by every handler
+k8s_configuration = client.Configuration.get_default_copy()
+k8s_configuration.connection_pool_maxsize = K8S_CONNECTION_POOL_SIZE
+api_client = _instrument_api_client(client.ApiClient(k8s_configuration))
+
+# Informers hold a watch open per namespace for each of deployments, pods, configmaps and HPAs, so they
+# get a pool of their own, sized for every watch at once, and never take the connections handlers keep alive.
+watch_configuration = client.Configuration.get_default_copy()
+watch_configuration.connection_pool_maxsize = 4 * INFORMER_MAX_NAMESPACES
+watch_api_client = _instrument_api_client(client.ApiClient(watch_configuration))
+
+
+def _route_template(request: Request):
+    """Path template of the route that will handle the request, so metric labels stay bounded."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class _FastJSONResponse(Response):
+    """JSON response rendered with orjson, for bodies that FastAPI's jsonable_encoder pass would slow down."""
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content)
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x".
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def _conditional_response(request: Request, etag, build, headers=None):
+    """304 when If-None-Match matches ``etag``, otherwise the JSON body returned by ``build()``.
+
+    ``etag`` must be computed before the body, so that a body is never older than its ETag.
+    """
+    headers = dict(headers or {})
+    if etag is not None:
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "no-cache"
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+    return _FastJSONResponse(build(), headers=headers)
+
+
+# Routes whose reads count against the admission limits. Deployment reads are admitted by their handler,
+# so that only the request that computes a coalesced read takes a slot.
+_ADMISSION_CONTROLLED_ROUTES = {
+    "/health",
+    "/health/{app_name}/history",
+}
+
+
+class _AdmissionController:
+    """Caps concurrent expensive reads, globally and per client."""
+
+    def __init__(self, limit, per_client_limit):
+        self._limit = limit
+        self._per_client_limit = per_client_limit
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._per_client = {}
+
+    def try_acquire(self, client_id):
+        """Take a slot; returns None, or the scope of the limit that is full."""
+        with self._lock:
+            if self._in_flight >= self._limit:
+                return "global"
+            if self._per_client.get(client_id, 0) >= self._per_client_limit:
+                return "client"
+            self._in_flight += 1
+            self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+            return None
+
+    def release(self, client_id):
+        with self._lock:
+            self._in_flight -= 1
+            self._per_client[client_id] -= 1
+            if not self._per_client[client_id]:
+                del self._per_client[client_id]
+
+
+_admission = _AdmissionController(READ_MAX_CONCURRENCY, READ_MAX_CONCURRENCY_PER_CLIENT)
+
+
+class _AdmissionRejected(Exception):
+    def __init__(self, scope):
+        super().__init__(f"Too many concurrent requests ({scope} limit)")
+        self.scope = scope
+
+
+def _admit(path, client_id):
+    """Take an admission slot of the client; raises _AdmissionRejected when a limit is full."""
+    scope = _admission.try_acquire(client_id)
+    if scope is not None:
+        ADMISSION_REJECTED_COUNT.labels(path=path, scope=scope).inc()
+        raise _AdmissionRejected(scope)
 
 
+@contextmanager
+def _admitted(path, client_id):
+    """Hold an admission slot of the client; raises _AdmissionRejected when a limit is full."""
+    _admit(path, client_id)
+    try:
+        yield
+    finally:
+        _admission.release(client_id)
+
+
+class _AdmittedStream:
+    """Iterates over ``body`` while holding the client's admission slot, until it is exhausted, closed or dropped."""
+
+    def __init__(self, body, client_id):
+        self._body = body
+        self._client_id = client_id
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._body)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            _admission.release(self._client_id)
+            self._body.close()
+
+    def __del__(self):
+        self.close()
+
+
+@app.exception_handler(_AdmissionRejected)
+async def _admission_rejected_handler(request: Request, e: _AdmissionRejected):
+    return JSONResponse(status_code=429, content={"detail": str(e)},
+                        headers={"Retry-After": str(READ_RETRY_AFTER_SECONDS)})
+
+
+def _client_id(request: Request):
+    if CLIENT_ID_HEADER and request.headers.get(CLIENT_ID_HEADER):
+        return request.headers[CLIENT_ID_HEADER].split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    path = request.state.route
+    if path not in _ADMISSION_CONTROLLED_ROUTES:
+        return await call_next(request)
+    try:
+        with _admitted(path, _client_id(request)):
+            return await call_next(request)
+    except _AdmissionRejected as e:
+        return await _admission_rejected_handler(request, e)
+
+
+@app.middleware("http")
+async def tracing_middleware(request: Request, call_next):
+    path = request.state.route
+    with _trace(f"{request.method} {path}", traceparent=request.headers.get("traceparent")) as span:
+        response = await call_next(request)
+        if span is not None:
+            span.attributes["status_code"] = response.status_code
+            response.headers["traceparent"] = span.traceparent()
+        return response
+
+
+# Added after admission_middleware and tracing_middleware, so that it runs first and also records rejected requests.
 @app.middleware("http")
 async def metrics_middleware(request: Request, call_next):
-    REQUEST_COUNT.labels(path=request.url.path).inc()
+    path = _route_template(request)
+    request.state.route = path
+    REQUEST_COUNT.labels(path=path).inc()
+    REQUESTS_IN_PROGRESS.labels(path=path).inc()
     start_time = time.perf_counter()
 
-    response = await call_next(request)
+    try:
+        response = await call_next(request)
+    finally:
+        REQUESTS_IN_PROGRESS.labels(path=path).dec()
 
-    process_time = (time.perf_counter() - start_time) * 1000
-    RESPONSE_TIME.labels(path=request.url.path).set(process_time)
+    process_time = time.perf_counter() - start_time
+    RESPONSE_TIME.labels(path=path).observe(process_time)
 
     if response.status_code >= 400:
-        FAILED_REQUEST_COUNT.labels(path=request.url.path).inc()
+        FAILED_REQUEST_COUNT.labels(path=path).inc()
 
     return response
 
 
 @app.get("/metrics")
 def get_metrics():
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Aggregate the values written by every worker process.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type="text/plain")
     return Response(generate_latest(), media_type="text/plain")
 
 
-def _create_secret(api_instance, namespace, secret_name, data):
+def _mark_dead_workers():
+    """Drop the live gauge files of worker processes that are gone, e.g. after a worker restart."""
+    paths = glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db"))
+    pids = {path.rsplit("_", 1)[-1][:-len(".db")] for path in paths}
+    for pid in pids:
+        if not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            multiprocess.mark_process_dead(int(pid))
+        except PermissionError:
+            pass
+
+
+async def _run_as_singleton(name, run):
+    """Run ``run()`` in only one worker process; the others wait on a lock file to take over."""
+    lock_file = open(os.path.join(SINGLETON_LOCK_DIR, f"kaas-api-{name}.lock"), "w")
+    try:
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(5)
+        logger.info(f"{name}: running in worker {os.getpid()}")
+        await run()
+    finally:
+        lock_file.close()
+
+
+def _is_subset(desired, live):
+    """True when every field set in ``desired`` has the same value in ``live``.
+
+    Fields only the server fills in (defaults, status, managed fields) are ignored, and an
+    empty desired value matches a missing live one.
+    """
+    if isinstance(desired, dict):
+        if not isinstance(live, dict):
+            return not desired and not live
+        return all(_is_subset(value, live.get(key)) for key, value in desired.items())
+    if isinstance(desired, list):
+        if not isinstance(live, list):
+            return not desired and not live
+        return len(desired) == len(live) and all(_is_subset(d, l) for d, l in zip(desired, live))
+    return desired == live
+
+
+def _read_live_object(api_instance, kind, namespace, name):
+    if kind == "deployment":
+        cached = _get_informer("deployments", namespace).get(name)
+        if cached is not None:
+            return cached
+    try:
+        return getattr(api_instance, f"read_namespaced_{kind}")(name, namespace)
+    except ApiException as e:
+        if e.status == 404:
+            return None
+        raise
+
+
+def _apply_object(api_instance, kind, namespace, body):
+    """Create the object, or merge-patch only when it differs from the live one.
+
+    Returns ``created``, ``patched`` or ``unchanged``.
+    """
+    serialize = api_instance.api_client.sanitize_for_serialization
+    desired = serialize(body)
+    name = desired["metadata"]["name"]
+    for _ in range(3):
+        live = _read_live_object(api_instance, kind, namespace, name)
+        if live is not None:
+            break
+        try:
+            getattr(api_instance, f"create_namespaced_{kind}")(namespace, body)
+            result = "created"
+            break
+        except ApiException as e:
+            # Someone else created it since we looked; compare against theirs, or create again if it is gone already.
+            if e.status != 409:
+                raise
+    else:
+        raise RuntimeError(f"{kind} {name} in namespace {namespace} keeps being created and deleted concurrently")
+    if live is not None:
+        comparable = {key: value for key, value in desired.items() if key not in ("apiVersion", "kind")}
+        if "stringData" in comparable:
+            # The server only returns secrets base64 encoded under data.
+            comparable["data"] = {key: base64.b64encode(value.encode()).decode()
+                                  for key, value in comparable.pop("stringData").items()}
+        if _is_subset(comparable, serialize(live)):
+            result = "unchanged"
+        else:
+            getattr(api_instance, f"patch_namespaced_{kind}")(name, namespace, desired,
+                                                              _content_type="application/merge-patch+json")
+            result = "patched"
+    APPLY_RESULT_COUNT.labels(kind=kind, result=result).inc()
+    return result
+
+
+def _submit(api_instance, kind, namespace, body, apply):
+    if apply:
+        return _apply_object(api_instance, kind, namespace, body)
+    getattr(api_instance, f"create_namespaced_{kind}")(namespace, body)
+    return "created"
+
+
+@_traced
+def _create_secret(api_instance, namespace, secret_name, data, apply=False):
     secret = client.V1Secret(
         metadata=client.V1ObjectMeta(name=secret_name),
         string_data=data
     )
-    api_instance.create_namespaced_secret(namespace, secret)
+    return _submit(api_instance, "secret", namespace, secret, apply)
 
 
-def _create_deployment(api_instance, namespace, app_name, image, replicas, resources, env_vars, secret_name=None):
+@_traced
+def _create_deployment(api_instance, namespace, app_name, image, replicas, resources, env_vars, secret_name=None,
+                       annotations=None, apply=False, limits=None):
     env = [client.V1EnvVar(name=var.Key, value=var.Value) for var in env_vars if not var.IsSecret]
     if secret_name:
         for var in env_vars:
@@ -99,7 +938,8 @@ def _create_deployment(api_instance, namespace, app_name, image, replicas, resou
         image=image,
         env=env,
         resources=client.V1ResourceRequirements(
-            requests=resources
+            requests=resources,
+            limits=limits or None
         )
     )
     template = client.V1PodTemplateSpec(
@@ -114,27 +954,95 @@ def _create_deployment(api_instance, namespace, app_name, image, replicas, resou
     deployment = client.V1Deployment(
         api_version="apps/v1",
         kind="Deployment",
-        metadata=client.V1ObjectMeta(name=app_name),
+        metadata=client.V1ObjectMeta(name=app_name, annotations=annotations),
         spec=spec
     )
-    api_instance.create_namespaced_deployment(
-        namespace=namespace,
-        body=deployment
+    return _submit(api_instance, "deployment", namespace, deployment, apply)
+
+
+def _scaling_rules(behavior: ScalingBehavior):
+    policies = []
+    if behavior.MaxPodsPerPeriod:
+        policies.append(client.V2HPAScalingPolicy(type="Pods", value=behavior.MaxPodsPerPeriod,
+                                                  period_seconds=behavior.PeriodSeconds))
+    if behavior.MaxPercentPerPeriod:
+        policies.append(client.V2HPAScalingPolicy(type="Percent", value=behavior.MaxPercentPerPeriod,
+                                                  period_seconds=behavior.PeriodSeconds))
+    return client.V2HPAScalingRules(
+        stabilization_window_seconds=behavior.StabilizationWindowSeconds,
+        # With several policies, the one allowing the largest change wins, as in the HPA default.
+        select_policy="Max" if policies else None,
+        policies=policies or None
+    )
+
+
+@_traced
+def _create_hpa(api_instance, namespace, app_name, autoscaling: AutoscalingSpec, apply=False):
+    targets = [("cpu", autoscaling.TargetCPUUtilization), ("memory", autoscaling.TargetMemoryUtilization)]
+    metrics = [
+        client.V2MetricSpec(
+            type="Resource",
+            resource=client.V2ResourceMetricSource(
+                name=name,
+                target=client.V2MetricTarget(type="Utilization", average_utilization=utilization)
+            )
+        )
+        for name, utilization in targets if utilization
+    ]
+
+    behavior = None
+    if autoscaling.ScaleUp or autoscaling.ScaleDown:
+        behavior = client.V2HorizontalPodAutoscalerBehavior(
+            scale_up=_scaling_rules(autoscaling.ScaleUp) if autoscaling.ScaleUp else None,
+            scale_down=_scaling_rules(autoscaling.ScaleDown) if autoscaling.ScaleDown else None
+        )
+    hpa = client.V2HorizontalPodAutoscaler(
+        api_version="autoscaling/v2",
+        kind="HorizontalPodAutoscaler",
+        metadata=client.V1ObjectMeta(name=app_name, labels={"app": app_name}),
+        spec=client.V2HorizontalPodAutoscalerSpec(
+            scale_target_ref=client.V2CrossVersionObjectReference(api_version="apps/v1", kind="Deployment",
+                                                                  name=app_name),
+            min_replicas=autoscaling.MinReplicas,
+            max_replicas=autoscaling.MaxReplicas,
+            metrics=metrics,
+            behavior=behavior
+        )
     )
+    return _submit(api_instance, "horizontal_pod_autoscaler", namespace, hpa, apply)
 
 
-def _create_service(api_instance, namespace, app_name, service_port):
+@_traced
+def _delete_hpa(api_instance, namespace, app_name):
+    """Remove the app's HPA, if it has one, so that the deployment goes back to a fixed replica count."""
+    try:
+        api_instance.delete_namespaced_horizontal_pod_autoscaler(app_name, namespace)
+        return "deleted"
+    except ApiException as e:
+        if e.status == 404:
+            return "unchanged"
+        raise
+
+
+@_traced
+def _create_service(api_instance, namespace, app_name, service_port, apply=False, extra_ports=()):
+    ports = [client.V1ServicePort(port=service_port, target_port=service_port)]
+    if extra_ports:
+        # Every port of a multi-port service needs a name.
+        ports = [client.V1ServicePort(name=f"tcp-{port}", port=port, target_port=port)
+                 for port in [service_port, *extra_ports]]
     service = client.V1Service(
         metadata=client.V1ObjectMeta(name=app_name),
         spec=client.V1ServiceSpec(
             selector={"app": app_name},
-            ports=[client.V1ServicePort(port=service_port, target_port=service_port)]
+            ports=ports
         )
     )
-    api_instance.create_namespaced_service(namespace, service)
+    return _submit(api_instance, "service", namespace, service, apply)
 
 
-def _create_ingress(api_instance, namespace, app_name, domain):
+@_traced
+def _create_ingress(api_instance, namespace, app_name, domain, apply=False):
     ingress = client.V1Ingress(
         metadata=client.V1ObjectMeta(name=app_name),
         spec=client.V1IngressSpec(
@@ -155,10 +1063,11 @@ def _create_ingress(api_instance, namespace, app_name, domain):
             )]
         )
     )
-    api_instance.create_namespaced_ingress(namespace, ingress)
+    return _submit(api_instance, "ingress", namespace, ingress, apply)
 
 
-def _create_cronjob(api_instance, namespace, app_name, port, db_config):
+@_traced
+def _create_cronjob(api_instance, namespace, app_name, port, db_config, apply=False):
     cronjob = client.V1CronJob(
         metadata=client.V1ObjectMeta(name=f"{app_name}-health-check"),
         spec=client.V1CronJobSpec(
@@ -197,12 +1106,14 @@ def _create_cronjob(api_instance, namespace, app_name, port, db_config):
             )
         )
     )
-    api_instance.create_namespaced_cron_job(namespace, cronjob)
+    return _submit(api_instance, "cron_job", namespace, cronjob, apply)
 
 
+@_traced
 def _get_db_config(namespace):
-    api_instance = client.CoreV1Api()
-    configmap = api_instance.read_namespaced_config_map(name="db-config", namespace=namespace)
+    configmap = _get_informer("configmaps", namespace).get("db-config")
+    if configmap is None:
+        raise RuntimeError(f"ConfigMap db-config not found in namespace {namespace}")
     db_config = {
         "DB_HOST": configmap.data["DB_HOST"],
         "DB_PORT": configmap.data["DB_PORT"],
@@ -214,95 +1125,1145 @@ def _get_db_config(namespace):
     return db_config
 
 
-def api_add_new_application(app_data: AppData):
+class _DBPool:
+    """Thread-safe pool of connections to one Postgres host.
+
+    Checkouts block for up to ``DB_POOL_TIMEOUT_SECONDS`` when every connection is in use,
+    instead of failing straight away like a bare ``ThreadedConnectionPool``. Connecting gives up
+    after ``DB_POOL_TIMEOUT_SECONDS`` as well.
+    """
+
+    def __init__(self, name, db_config, host):
+        self.name = name
+        self.db_config = db_config
+        self._pool = ThreadedConnectionPool(
+            DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+            host=host,
+            port=db_config['DB_PORT'],
+            database=db_config['DB_NAME'],
+            user=db_config['DB_USER'],
+            password=db_config['DB_PASSWORD'],
+            connect_timeout=max(1, math.ceil(DB_POOL_TIMEOUT_SECONDS))
+        )
+        self._slots = threading.BoundedSemaphore(DB_POOL_MAX_SIZE)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._retired = False
+        DB_POOL_SIZE.labels(pool=name).set(DB_POOL_MAX_SIZE)
+
+    @contextmanager
+    def connection(self):
+        with _span(f"db {self.name}", _SPAN_CLIENT) as span:
+            start_time = time.perf_counter()
+            if not self._slots.acquire(timeout=DB_POOL_TIMEOUT_SECONDS):
+                raise TimeoutError(f"no free connection in the {self.name} pool after {DB_POOL_TIMEOUT_SECONDS}s")
+            with self._lock:
+                self._in_use += 1
+            try:
+                connection = self._pool.getconn()
+            except Exception:
+                self._returned()
+                self._slots.release()
+                raise
+            checkout_time = time.perf_counter()
+            DB_POOL_WAIT_TIME.labels(pool=self.name).observe(checkout_time - start_time)
+            DB_POOL_IN_USE.labels(pool=self.name).inc()
+            if span is not None:
+                span.attributes["pool_wait_ms"] = round((checkout_time - start_time) * 1000, 3)
+            try:
+                yield connection
+            finally:
+                # Never hand a connection back in the middle of a transaction.
+                if not connection.closed:
+                    try:
+                        connection.rollback()
+                    except psycopg2.Error:
+                        connection.close()
+                self._pool.putconn(connection, close=bool(connection.closed))
+                self._returned()
+                self._slots.release()
+                DB_POOL_IN_USE.labels(pool=self.name).dec()
+                DB_POOL_CHECKOUT_TIME.labels(pool=self.name).observe(time.perf_counter() - checkout_time)
+
+    def _returned(self):
+        with self._lock:
+            self._in_use -= 1
+            close = self._retired and not self._in_use
+        if close:
+            self._pool.closeall()
+
+    def retire(self):
+        """Close the pool once every connection checked out of it is returned."""
+        with self._lock:
+            self._retired = True
+            close = not self._in_use
+        if close:
+            self._pool.closeall()
+
+
+_db_pools = {}
+# One lock per role, so that a host that is slow to connect does not hold up the other one
+_db_pool_locks = {'master': threading.Lock(), 'slave': threading.Lock()}
+
+
+def _get_db_pool(role, namespace='default'):
+    """Pool for the ``master`` or ``slave`` host, rebuilt whenever the db-config ConfigMap changes."""
+    db_config = _get_db_config(namespace)
+    pool = _db_pools.get(role)
+    if pool is not None and pool.db_config == db_config:
+        return pool
+    with _db_pool_locks[role]:
+        pool = _db_pools.get(role)
+        if pool is None or pool.db_config != db_config:
+            host = db_config['DB_HOST'] if role == 'master' else db_config['DB_HOST_SLAVE']
+            previous, pool = pool, _DBPool(role, db_config, host)
+            _db_pools[role] = pool
+            if previous is not None:
+                logger.info(f"db-config changed, rebuilt the {role} connection pool")
+                previous.retire()
+    return pool
+
+
+def _check_api_server():
+    client.VersionApi(api_client).get_code(_request_timeout=DEPENDENCY_CHECK_TIMEOUT_SECONDS)
+
+
+# Seconds the replica is behind; zero when it has replayed everything it received, even if that was long ago
+_REPLICA_LAG_QUERY = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+
+def _check_database(role):
+    try:
+        with _get_db_pool(role).connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SET LOCAL statement_timeout = %s", (int(DEPENDENCY_CHECK_TIMEOUT_SECONDS * 1000),))
+            cursor.execute(_REPLICA_LAG_QUERY if role == 'slave' else "SELECT 1")
+            result = cursor.fetchone()[0]
+    except Exception:
+        _read_router.observe(role, False)
+        raise
+    _read_router.observe(role, True, float(result) if role == 'slave' else None)
+
+
+class _ReadRouter:
+    """Picks the host for read queries from the health of both hosts and the replica's lag.
+
+    Reads go to the slave while it is up and at most ``DB_REPLICA_MAX_LAG_SECONDS`` behind, and to
+    the master otherwise. The dependency monitor keeps the state current in the background.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._up = {}
+        self._lag = None
+
+    def observe(self, role, up, lag=None):
+        with self._lock:
+            self._up[role] = up
+            if role == 'slave':
+                self._lag = lag
+        DB_HOST_UP.labels(role=role).set(1 if up else 0)
+        if lag is not None:
+            DB_REPLICA_LAG.set(lag)
+
+    def route(self):
+        """The role to read from, and why."""
+        with self._lock:
+            slave_up = self._up.get('slave')
+            master_up = self._up.get('master')
+            lag = self._lag
+        if slave_up is None:
+            return 'slave', 'unknown'
+        if not slave_up:
+            reason = 'replica_down'
+        elif lag is not None and lag > DB_REPLICA_MAX_LAG_SECONDS:
+            reason = 'replica_lagging'
+        else:
+            return 'slave', 'ok'
+        if master_up is False:
+            return 'slave', 'master_down'
+        return 'master', reason
+
+
+_read_router = _ReadRouter()
+
+
+@contextmanager
+def _read_connection():
+    """Pooled connection for read queries, on the host the read router picks.
+
+    When the slave cannot be reached, the read falls back to the master straight away.
+    """
+    target, reason = _read_router.route()
+    with ExitStack() as stack:
+        try:
+            connection = stack.enter_context(_get_db_pool(target).connection())
+        except (psycopg2.OperationalError, TimeoutError):
+            if target != 'slave':
+                raise
+            _read_router.observe('slave', False)
+            target, reason = 'master', 'replica_down'
+            connection = stack.enter_context(_get_db_pool('master').connection())
+        DB_READ_ROUTE_COUNT.labels(target=target, reason=reason).inc()
+        yield connection
+
+
+class _DependencyMonitor:
+    """Checks the API server and both Postgres hosts in the background for the probe endpoints.
+
+    A dependency is healthy until it fails ``DEPENDENCY_FAILURE_THRESHOLD`` checks in a row or
+    has not passed a check for ``DEPENDENCY_STALENESS_SECONDS``, so a short blip does not
+    make every replica unready at once.
+    Each dependency is checked on a schedule of its own, and a check that has not finished after
+    ``DEPENDENCY_CHECK_TIMEOUT_SECONDS`` counts as failed; it is not started again until it returns.
+    """
+
+    def __init__(self, checks):
+        self._checks = checks
+        self._lock = threading.Lock()
+        self._state = {name: {"failures": 0, "last_success": None, "error": None} for name in checks}
+        self._threads = None
+
+    def start(self):
+        if self._threads is None:
+            self._threads = [threading.Thread(target=self._run, args=(name, check), name=f"dependency-monitor-{name}",
+                                              daemon=True)
+                             for name, check in self._checks.items()]
+            for thread in self._threads:
+                thread.start()
+
+    @staticmethod
+    def _call(check, result):
+        try:
+            check()
+        except Exception as e:
+            result["error"] = e
+
+    def _run(self, name, check):
+        call = None
+        while True:
+            if call is None or not call.is_alive():
+                result = {}
+                call = threading.Thread(target=self._call, args=(check, result), name=f"dependency-check-{name}",
+                                        daemon=True)
+                call.start()
+            call.join(DEPENDENCY_CHECK_TIMEOUT_SECONDS)
+            if call.is_alive():
+                error = TimeoutError(f"check did not finish in {DEPENDENCY_CHECK_TIMEOUT_SECONDS}s")
+            else:
+                error = result.get("error")
+            with self._lock:
+                if error is None:
+                    self._state[name] = {"failures": 0, "last_success": time.monotonic(), "error": None}
+                else:
+                    state = self._state[name]
+                    self._state[name] = dict(state, failures=state["failures"] + 1, error=str(error))
+            # Jitter keeps replicas that started together from checking in lockstep.
+            time.sleep(DEPENDENCY_CHECK_INTERVAL_SECONDS * random.uniform(0.9, 1.1))
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            state = dict(self._state)
+        return {
+            name: {
+                "healthy": (dependency["last_success"] is not None
+                            and dependency["failures"] < DEPENDENCY_FAILURE_THRESHOLD
+                            and now - dependency["last_success"] <= DEPENDENCY_STALENESS_SECONDS),
+                "consecutive_failures": dependency["failures"],
+                "last_success_age": None if dependency["last_success"] is None else now - dependency["last_success"],
+                "error": dependency["error"]
+            }
+            for name, dependency in state.items()
+        }
+
+    def started(self):
+        with self._lock:
+            return self._state["api_server"]["last_success"] is not None
+
+
+_dependency_monitor = _DependencyMonitor({
+    "api_server": _check_api_server,
+    "postgres_master": lambda: _check_database('master'),
+    "postgres_slave": lambda: _check_database('slave'),
+})
+
+
+class _RateLimiter:
+    """Spaces out callers on the event loop so that at most ``rate`` calls start per second."""
+
+    def __init__(self, rate):
+        self._interval = 1 / rate
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class _Provisioner:
+    """Creates a set of Kubernetes objects concurrently and rolls back the created ones on failure.
+
+    Each step runs its blocking client call on the default executor once the steps it
+    depends on have finished. When a rate limiter is given, every API call waits for it first.
+    Steps return ``created``, ``patched`` or ``unchanged``; only created objects are rolled back.
+    When ``on_step`` is given, it is called with each step and its state as the step progresses.
+    """
+
+    def __init__(self, rate_limiter=None, on_step=None):
+        self._tasks = {}
+        self._created = []
+        self._rate_limiter = rate_limiter
+        self._on_step = on_step
+        self.results = {}
+
+    async def _call(self, func):
+        if self._rate_limiter is not None:
+            await self._rate_limiter.acquire()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _in_context(func))
+
+    async def _report(self, step, state):
+        if self._on_step is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, _in_context(self._on_step, step, state))
+        except Exception as e:
+            logger.error(f"provisioning: failed to report {step} {state} because {e}")
+
+    def add(self, step, create, delete, after=()):
+        self._tasks[step] = asyncio.ensure_future(self._run(step, create, delete, after))
+
+    async def _run(self, step, create, delete, after):
+        for dependency in after:
+            await self._tasks[dependency]
+        await self._report(step, "running")
+        try:
+            self.results[step] = await self._call(create)
+        except Exception:
+            await self._report(step, "failed")
+            raise
+        if self.results[step] == "created":
+            self._created.append((step, delete))
+        await self._report(step, self.results[step])
+
+    async def wait(self):
+        results = await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            await self._rollback()
+            raise errors[0]
+
+    async def _rollback(self):
+        for step, delete in reversed(self._created):
+            try:
+                await self._call(delete)
+                await self._report(step, "rolled back")
+                logger.info(f"provisioning: rolled back {step}")
+            except Exception as e:
+                logger.error(f"provisioning: failed to roll back {step} because {e}")
+
+
+async def api_add_new_application(app_data: AppData, rate_limiter=None, apply=False, on_step=None,
+                                  secret_written=False):
     namespace = 'default'
-    api_instance = client.CoreV1Api()
-    apps_api = client.AppsV1Api()
-    networking_v1_api = client.NetworkingV1Api()
-    batch_api = client.BatchV1Api()
+    api_instance = client.CoreV1Api(api_client)
+    apps_api = client.AppsV1Api(api_client)
+    networking_v1_api = client.NetworkingV1Api(api_client)
+    batch_api = client.BatchV1Api(api_client)
+    autoscaling_api = client.AutoscalingV2Api(api_client)
 
     app_name = app_data.AppName
     replicas = app_data.Replicas
+    autoscaling = app_data.Autoscaling
+    if autoscaling:
+        # The HPA owns the replica count once the deployment exists; re-applying must not reset it.
+        replicas = None if apply else autoscaling.MinReplicas
     image = f"{app_data.ImageAddress}:{app_data.ImageTag}"
     service_port = app_data.ServicePort
     resources = {
         'cpu': app_data.Resources['CPU'],
         'memory': app_data.Resources['RAM']
     }
+    limits = {key: app_data.Resources[name] for key, name in (('cpu', 'CPULimit'), ('memory', 'RAMLimit'))
+              if app_data.Resources.get(name)}
     env_vars = app_data.Envs
     domain = app_data.DomainAddress
     monitor = app_data.Monitor
 
+    provisioner = _Provisioner(rate_limiter, on_step)
+
+    annotations = None
+    if monitor == "true" and HEALTH_CHECK_MODE != "cronjob":
+        annotations = {
+            MONITOR_ANNOTATION: "true",
+            MONITOR_PORT_ANNOTATION: str(service_port),
+            MONITOR_INTERVAL_ANNOTATION: str(app_data.MonitorInterval or PROBER_DEFAULT_INTERVAL_SECONDS),
+            MONITOR_TIMEOUT_ANNOTATION: str(app_data.MonitorTimeout or PROBER_DEFAULT_TIMEOUT_SECONDS)
+        }
+
     secret_name = None
+    deployment_after = ()
     if any(env.IsSecret for env in env_vars):
         secret_name = f"{app_name}-secret"
+    if secret_name and not secret_written:
         secret_data = {env.Key: env.Value for env in env_vars if env.IsSecret}
-        _create_secret(api_instance, namespace, secret_name, secret_data)
-
-    _create_deployment(apps_api, namespace, app_name, image, replicas, resources, env_vars, secret_name)
-    _create_service(api_instance, namespace, app_name, service_port)
+        provisioner.add(
+            "secret",
+            lambda: _create_secret(api_instance, namespace, secret_name, secret_data, apply),
+            lambda: api_instance.delete_namespaced_secret(secret_name, namespace)
+        )
+        deployment_after = ("secret",)
+
+    provisioner.add(
+        "deployment",
+        lambda: _create_deployment(apps_api, namespace, app_name, image, replicas, resources, env_vars, secret_name,
+                                   annotations, apply, limits),
+        lambda: apps_api.delete_namespaced_deployment(app_name, namespace, propagation_policy="Background"),
+        after=deployment_after
+    )
+    if autoscaling:
+        provisioner.add(
+            "hpa",
+            lambda: _create_hpa(autoscaling_api, namespace, app_name, autoscaling, apply),
+            lambda: autoscaling_api.delete_namespaced_horizontal_pod_autoscaler(app_name, namespace),
+            after=("deployment",)
+        )
+    elif apply:
+        provisioner.add(
+            "hpa",
+            lambda: _delete_hpa(autoscaling_api, namespace, app_name),
+            lambda: None
+        )
+    provisioner.add(
+        "service",
+        lambda: _create_service(api_instance, namespace, app_name, service_port, apply),
+        lambda: api_instance.delete_namespaced_service(app_name, namespace)
+    )
 
     if domain:
-        _create_ingress(networking_v1_api, namespace, app_name, domain)
+        provisioner.add(
+            "ingress",
+            lambda: _create_ingress(networking_v1_api, namespace, app_name, domain, apply),
+            lambda: networking_v1_api.delete_namespaced_ingress(app_name, namespace)
+        )
+
+    if monitor == "true" and HEALTH_CHECK_MODE == "cronjob":
+        provisioner.add(
+            "cronjob",
+            lambda: _create_cronjob(batch_api, namespace, app_name, service_port, _get_db_config(namespace), apply),
+            lambda: batch_api.delete_namespaced_cron_job(f"{app_name}-health-check", namespace,
+                                                         propagation_policy="Background")
+        )
+
+    await provisioner.wait()
+    return provisioner.results
+
+
+# Each worker gets its share of the QPS ceiling.
+_batch_rate_limiter = _RateLimiter(BATCH_MAX_QPS / KAAS_WORKERS)
 
-    create_health_status_table()
 
-    if monitor == "true":
-        db_config = _get_db_config(namespace)
-        _create_cronjob(batch_api, namespace, app_name, service_port, db_config)
+async def _read_app_data_batch(lines):
+    """Parse and validate every JSONL record up front; returns (valid, rejected) lists."""
+    valid, rejected = [], []
+    seen = set()
+    index = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            app_data = AppData(**json.loads(line))
+            if app_data.AppName in seen:
+                raise ValueError(f"duplicate AppName {app_data.AppName} in batch")
+            seen.add(app_data.AppName)
+            valid.append((index, app_data))
+        except (ValueError, TypeError, ValidationError) as e:
+            rejected.append({"index": index, "status": "invalid", "detail": str(e)})
+        index += 1
+    return valid, rejected
+
+
+async def api_add_new_applications_batch(valid):
+    """Provision validated records with a bounded worker pool, yielding each result as it finishes."""
+    workers = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def provision(index, app_data):
+        async with workers:
+            try:
+                await api_add_new_application(app_data, _batch_rate_limiter)
+                BATCH_RECORD_COUNT.labels(result='created').inc()
+                return {"index": index, "AppName": app_data.AppName, "status": "created"}
+            except Exception as e:
+                BATCH_RECORD_COUNT.labels(result='failed').inc()
+                return {"index": index, "AppName": app_data.AppName, "status": "failed", "detail": str(e)}
+
+    tasks = [asyncio.ensure_future(provision(index, app_data)) for index, app_data in valid]
+    for task in asyncio.as_completed(tasks):
+        yield await task
+
+
+class _SingleFlight:
+    """Runs one call per key at a time; callers that arrive while it runs wait for it and share its result."""
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event()}
+        if not leader:
+            call["done"].wait()
+            COALESCED_READ_COUNT.labels(path=self._path).inc()
+            if "error" in call:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = func()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+class _Informer:
+    """In-memory copy of one namespaced resource kind, kept current by list-then-watch.
+
+    Objects are stored by name and indexed by their ``app`` label. A full relist is done
+    on start, every ``INFORMER_RESYNC_SECONDS`` and whenever the watch resourceVersion expires.
+    Subscribers are called with every change, including the ones a relist finds, and the last
+    ``INFORMER_EVENT_HISTORY`` resourceVersions are kept so that subscribers can resume.
+    With ``decode``, responses are not turned into client models: lists and watch events are
+    parsed as plain JSON and each object is stored as ``decode(obj)``.
+    If the first list is refused (401, 403 or 404), the informer gives up and ``wait_for_sync``
+    raises that error.
+    """
+
+    def __init__(self, resource, list_func, namespace, decode=None):
+        self.resource = resource
+        self.namespace = namespace
+        self._list_func = list_func
+        self._decode = decode
+        self._lock = threading.Lock()
+        self._objects = {}
+        self._index = {}
+        self._resource_version = None
+        self._last_list = 0.0
+        self._last_sync = None
+        self._synced = threading.Event()
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._error = None
+        self.failed_at = None
+        self._history = collections.deque(maxlen=INFORMER_EVENT_HISTORY)
+        self._subscribers = set()
+        self._thread = threading.Thread(target=self._run, name=f"informer-{resource}-{namespace}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                if self._resource_version is None or time.monotonic() - self._last_list > INFORMER_RESYNC_SECONDS:
+                    self._list()
+                self._watch()
+                backoff = 1
+            except ApiException as e:
+                if e.status == 410:
+                    logger.info(f"informer {self.resource}/{self.namespace}: resourceVersion expired, relisting")
+                    self._resource_version = None
+                    continue
+                logger.error(f"informer {self.resource}/{self.namespace}: failed because {e}")
+                if e.status in (401, 403, 404) and not self._synced.is_set():
+                    self._error = e
+                    self.failed_at = time.monotonic()
+                    self._ready.set()
+                    return
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, 30)
+            except Exception as e:
+                logger.error(f"informer {self.resource}/{self.namespace}: failed because {e}")
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def stop(self):
+        """Make the thread exit, at the latest when its current watch times out."""
+        self._stopped.set()
+
+    def active(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def _list(self):
+        if self._decode is None:
+            result = self._list_func(namespace=self.namespace)
+            items, resource_version = result.items, result.metadata.resource_version
+        else:
+            result = orjson.loads(self._list_func(namespace=self.namespace, _preload_content=False).data)
+            items = [self._decode(item) for item in result["items"]]
+            resource_version = result["metadata"]["resourceVersion"]
+        objects = {obj.metadata.name: obj for obj in items}
+        index = {}
+        for name, obj in objects.items():
+            index.setdefault(self._app_label(obj), {})[name] = obj
+        with self._lock:
+            if self._synced.is_set():
+                # Changes that happened while the watch was down only show up as a difference with the last list.
+                for name, obj in objects.items():
+                    previous = self._objects.get(name)
+                    if previous is None:
+                        self._record("ADDED", obj, obj.metadata.resource_version)
+                    elif previous.metadata.resource_version != obj.metadata.resource_version:
+                        self._record("MODIFIED", obj, obj.metadata.resource_version)
+                for name, obj in self._objects.items():
+                    if name not in objects:
+                        self._record("DELETED", obj, obj.metadata.resource_version)
+            self._record("RELIST", None, resource_version)
+            self._objects = objects
+            self._index = index
+            self._resource_version = resource_version
+            self._last_list = time.monotonic()
+            self._last_sync = self._last_list
+        INFORMER_RELIST_COUNT.labels(resource=self.resource).inc()
+        self._synced.set()
+        self._ready.set()
+
+    def _list_raw(self, *args, **kwargs):
+        """Call the list function for undecoded JSON.
+
+        The watch decodes events into the model named by the function's docstring, and this one names
+        none, so its events keep the object as a plain dict.
+        """
+        kwargs["_preload_content"] = False
+        return self._list_func(*args, **kwargs)
+
+    def _watch(self):
+        w = watch.Watch()
+        func = self._list_func if self._decode is None else self._list_raw
+        for event in w.stream(func, namespace=self.namespace, resource_version=self._resource_version,
+                              timeout_seconds=INFORMER_WATCH_TIMEOUT_SECONDS, allow_watch_bookmarks=True):
+            if self._stopped.is_set():
+                w.stop()
+                return
+            obj = event["object"] if self._decode is None else self._decode(event["object"])
+            self._apply(event["type"], obj)
+        # The watch ran to its timeout without error, so the cache was in sync up to now.
+        with self._lock:
+            self._last_sync = time.monotonic()
+
+    def _apply(self, event_type, obj):
+        name = obj.metadata.name
+        with self._lock:
+            if event_type != "BOOKMARK":
+                previous = self._objects.pop(name, None)
+                if previous is not None:
+                    self._index.get(self._app_label(previous), {}).pop(name, None)
+                if event_type != "DELETED":
+                    self._objects[name] = obj
+                    self._index.setdefault(self._app_label(obj), {})[name] = obj
+            self._resource_version = obj.metadata.resource_version
+            self._last_sync = time.monotonic()
+            self._record(event_type, None if event_type == "BOOKMARK" else obj, obj.metadata.resource_version)
+        INFORMER_EVENT_COUNT.labels(resource=self.resource, type=event_type).inc()
+
+    def _record(self, event_type, obj, resource_version):
+        """Add a resourceVersion to the history and pass changes on to subscribers; called with the lock held."""
+        self._history.append((resource_version, event_type, obj))
+        if obj is not None:
+            for subscriber in self._subscribers:
+                subscriber(self.resource, event_type, obj)
+
+    def subscribe(self, subscriber, after=None):
+        """Call ``subscriber(resource, event_type, obj)`` for every change from now on.
+
+        Returns the current resourceVersion and the changes after resourceVersion ``after``,
+        or None instead of the changes when ``after`` is no longer in the history.
+        """
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if after is None or after == self._resource_version:
+                return self._resource_version, []
+            versions = [resource_version for resource_version, _, _ in self._history]
+            if after not in versions:
+                return self._resource_version, None
+            missed = list(self._history)[versions.index(after) + 1:]
+            return self._resource_version, [(self.resource, event_type, obj)
+                                            for _, event_type, obj in missed if obj is not None]
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @staticmethod
+    def _app_label(obj):
+        return (obj.metadata.labels or {}).get("app")
+
+    def wait_for_sync(self, timeout=INFORMER_SYNC_TIMEOUT_SECONDS):
+        if not self._ready.wait(timeout):
+            raise RuntimeError(f"{self.resource} cache for namespace {self.namespace} is not synced yet")
+        if self._error is not None:
+            raise self._error
+
+    def get(self, name):
+        with self._lock:
+            return self._objects.get(name)
+
+    def list(self):
+        with self._lock:
+            return sorted(self._objects.values(), key=lambda obj: obj.metadata.name)
+
+    def by_app(self, app_name):
+        with self._lock:
+            return sorted(self._index.get(app_name, {}).values(), key=lambda obj: obj.metadata.name)
+
+    def resource_version(self):
+        with self._lock:
+            return self._resource_version
+
+    def staleness(self):
+        with self._lock:
+            if self._last_sync is None:
+                return None
+            return time.monotonic() - self._last_sync
+
+
+_informers = {}
+# Namespaces with informers, least recently used first
+_informer_namespaces = collections.OrderedDict()
+_informers_lock = threading.Lock()
+
+
+def _evict_informers():
+    """Stop the informers of the least recently used namespaces beyond ``INFORMER_MAX_NAMESPACES``.
+
+    Called with ``_informers_lock`` held. The managed namespace and namespaces with event stream
+    clients are kept.
+    """
+    excess = len(_informer_namespaces) - INFORMER_MAX_NAMESPACES
+    for namespace in list(_informer_namespaces):
+        if excess <= 0:
+            break
+        keys = [key for key in _informers if key[1] == namespace]
+        if namespace == 'default' or any(_informers[key].active() for key in keys):
+            continue
+        for key in keys:
+            _informers.pop(key).stop()
+        del _informer_namespaces[namespace]
+        excess -= 1
+
+
+def _get_informer(resource, namespace, sync_timeout=INFORMER_SYNC_TIMEOUT_SECONDS):
+    with _informers_lock:
+        informer = _informers.get((resource, namespace))
+        if informer is not None and informer.failed_at is not None \
+                and time.monotonic() - informer.failed_at > INFORMER_ERROR_CACHE_SECONDS:
+            informer = None
+        _informer_namespaces[namespace] = True
+        _informer_namespaces.move_to_end(namespace)
+        if informer is None:
+            if resource == "deployments":
+                list_func = client.AppsV1Api(watch_api_client).list_namespaced_deployment
+            elif resource == "configmaps":
+                list_func = client.CoreV1Api(watch_api_client).list_namespaced_config_map
+            elif resource == "horizontalpodautoscalers":
+                list_func = client.AutoscalingV2Api(watch_api_client).list_namespaced_horizontal_pod_autoscaler
+            else:
+                list_func = client.CoreV1Api(watch_api_client).list_namespaced_pod
+            informer = _Informer(resource, list_func, namespace, _PodView if resource == "pods" else None)
+            _informers[(resource, namespace)] = informer
+            _evict_informers()
+    informer.wait_for_sync(sync_timeout)
+    return informer
 
 
-def _deployment_status(deployment: V1Deployment, core_api, namespace):
+def _get_autoscalers(namespace):
+    """HPA cache of the namespace, or None while it is not synced or HPAs cannot be listed.
+
+    Autoscaling details are optional in deployment statuses, so this waits only briefly and
+    deployment reads must not wait on it.
+    """
+    try:
+        return _get_informer("horizontalpodautoscalers", namespace, sync_timeout=1)
+    except (RuntimeError, ApiException):
+        return None
+
+
+def _deployment_status(deployment: V1Deployment, pods, autoscalers=None):
+    autoscaler = autoscalers.get(deployment.metadata.name) if autoscalers is not None else None
     status = {
         "DeploymentName": deployment.metadata.name,
         "Replicas": deployment.spec.replicas,
+        "CurrentReplicas": deployment.status.replicas,
         "ReadyReplicas": deployment.status.ready_replicas,
+        "Autoscaling": _autoscaler_status(autoscaler) if autoscaler is not None else None,
         "PodStatuses": []
     }
-    pod_list = core_api.list_namespaced_pod(namespace, label_selector=f"app={deployment.metadata.name}")
-    for pod in pod_list.items:
-        pod_status = {
-            "Name": pod.metadata.name,
-            "Phase": pod.status.phase,
-            "HostIP": pod.status.host_ip,
-            "PodIP": pod.status.pod_ip,
-            "StartTime": pod.status.start_time.strftime("%m/%d/%Y, %H:%M:%S")
-        }
-        status["PodStatuses"].append(pod_status)
+    for pod in pods:
+        status["PodStatuses"].append(pod.status)
     return status
 
 
-def api_get_deployment_status(namespace, app_name):
-    apps_api = client.AppsV1Api()
-    core_api = client.CoreV1Api()
+def _deployment_summary(deployment: V1Deployment, pods):
+    phases = {}
+    for pod in pods:
+        phases[pod.phase] = phases.get(pod.phase, 0) + 1
+    return {
+        "DeploymentName": deployment.metadata.name,
+        "Replicas": deployment.spec.replicas,
+        "CurrentReplicas": deployment.status.replicas,
+        "ReadyReplicas": deployment.status.ready_replicas,
+        "PodPhases": phases
+    }
+
+
+def _status_builder(pods, autoscalers, view="full", phases=None):
+    """Function from a deployment to its status in ``view``, counting only the pods in ``phases`` when given."""
+    def pods_of(deployment):
+        selected = pods.by_app(deployment.metadata.name)
+        if phases:
+            selected = [pod for pod in selected if pod.phase in phases]
+        return selected
+
+    if view == "summary":
+        return lambda deployment: _deployment_summary(deployment, pods_of(deployment))
+    return lambda deployment: _deployment_status(deployment, pods_of(deployment), autoscalers)
+
+
+def _autoscaler_status(hpa):
+    status = {
+        "MinReplicas": hpa.spec.min_replicas,
+        "MaxReplicas": hpa.spec.max_replicas,
+        "CurrentReplicas": None,
+        "DesiredReplicas": None,
+        "LastScaleTime": None,
+        "LastDecision": None
+    }
+    if hpa.status is None:
+        return status
+    status["CurrentReplicas"] = hpa.status.current_replicas
+    status["DesiredReplicas"] = hpa.status.desired_replicas
+    if hpa.status.last_scale_time:
+        status["LastScaleTime"] = hpa.status.last_scale_time.strftime("%m/%d/%Y, %H:%M:%S")
+    for condition in hpa.status.conditions or ():
+        # AbleToScale carries the outcome of the controller's last attempt to change the replica count.
+        if condition.type == "AbleToScale":
+            status["LastDecision"] = {"Reason": condition.reason, "Message": condition.message}
+    return status
+
+
+def _pod_status(metadata, status):
+    start_time = status.get("startTime")
+    if start_time:
+        start_time = datetime.datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%SZ").strftime("%m/%d/%Y, %H:%M:%S")
+    return {
+        "Name": metadata.get("name"),
+        "Phase": status.get("phase"),
+        "HostIP": status.get("hostIP"),
+        "PodIP": status.get("podIP"),
+        "StartTime": start_time
+    }
+
+
+class _PodView:
+    """The parts of a pod that deployment statuses use, taken from its JSON.
+
+    The pod cache keeps these instead of ``V1Pod`` models, whose specs, volumes and managed
+    fields cost far more to decode and hold than the status needs. The status is formatted
+    once per pod version rather than on every read.
+    """
+
+    __slots__ = ("metadata", "phase", "status")
+
+    def __init__(self, obj):
+        metadata = obj.get("metadata") or {}
+        status = obj.get("status") or {}
+        self.metadata = client.V1ObjectMeta(name=metadata.get("name"), labels=metadata.get("labels"),
+                                            resource_version=metadata.get("resourceVersion"))
+        self.phase = status.get("phase")
+        self.status = _pod_status(metadata, status)
+
+
+_deployment_reads = _SingleFlight("/deployments")
+
+
+def api_cache_staleness(namespace):
+    """Seconds since the deployment and pod caches of the namespace were last known to be in sync."""
+    ages = [_get_informer(resource, namespace).staleness() for resource in ("deployments", "pods")]
+    if any(age is None for age in ages):
+        return None
+    return max(ages)
+
+
+def api_deployment_status_etag(namespace, app_name, view="full", phases=None):
+    """ETag of a deployment status, from the resourceVersions it is built from; None when there is no deployment.
+
+    The whole namespace is tagged with the resourceVersions of the deployment and pod caches, which
+    move on every change in the namespace. resourceVersions come from the API server, so the ETag is
+    the same on every worker and replica. Other views and phase filters get their own ETags.
+    """
+    deployments = _get_informer("deployments", namespace)
+    pods = _get_informer("pods", namespace)
+    autoscalers = _get_autoscalers(namespace)
+    variant = ""
+    if view != "full" or phases:
+        variant = "-" + view + "".join(f"-{phase}" for phase in sorted(phases or ()))
+
+    if not app_name:
+        etag = f"{deployments.resource_version()}.{pods.resource_version()}"
+        if autoscalers is not None:
+            etag += f".{autoscalers.resource_version()}"
+        return f'"{etag}{variant}"'
+
+    deployment = deployments.get(app_name)
+    if deployment is None:
+        return None
+    digest = hashlib.sha1(deployment.metadata.resource_version.encode())
+    for pod in pods.by_app(app_name):
+        digest.update(f"|{pod.metadata.name}:{pod.metadata.resource_version}".encode())
+    autoscaler = autoscalers.get(app_name) if autoscalers is not None else None
+    if autoscaler is not None:
+        digest.update(f"|hpa:{autoscaler.metadata.resource_version}".encode())
+    return f'"{digest.hexdigest()[:20]}{variant}"'
+
+
+def api_get_deployment_status(namespace, app_name, view="full", phases=None):
+    deployments = _get_informer("deployments", namespace)
+    build = _status_builder(_get_informer("pods", namespace), _get_autoscalers(namespace), view, phases)
 
     if app_name:
+        deployment = deployments.get(app_name)
+        if deployment is None:
+            return {"error": f"Deployment {app_name} not found in namespace {namespace}"}
+        return build(deployment)
+
+    return [build(deployment) for deployment in deployments.list()]
+
+
+def api_get_deployment_status_page(namespace, limit, continue_token=None, view="full", phases=None):
+    """One page of deployment statuses, paged with the Kubernetes list continue token."""
+    apps_api = client.AppsV1Api(api_client)
+    build = _status_builder(_get_informer("pods", namespace), _get_autoscalers(namespace), view, phases)
+
+    kwargs = {"limit": limit}
+    if continue_token:
+        kwargs["_continue"] = continue_token
+    page = apps_api.list_namespaced_deployment(namespace=namespace, **kwargs)
+    return {
+        "items": [build(deployment) for deployment in page.items],
+        "continue": page.metadata._continue or None
+    }
+
+
+def api_stream_deployment_status(namespace, view="full", phases=None):
+    """NDJSON lines of deployment statuses, each one sent as soon as it is assembled."""
+    deployments = _get_informer("deployments", namespace)
+    build = _status_builder(_get_informer("pods", namespace), _get_autoscalers(namespace), view, phases)
+
+    def generate():
+        for deployment in deployments.list():
+            yield orjson.dumps(build(deployment)) + b"\n"
+
+    return generate()
+
+
+class _EventSubscription:
+    """Deployment and pod changes for one event stream client, handed from informer threads to the event loop.
+
+    A client that falls ``SSE_SUBSCRIBER_BUFFER`` events behind is marked as overflowed and disconnected;
+    it can reconnect and resume with the last event ID it saw.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SSE_SUBSCRIBER_BUFFER)
+        self.overflowed = False
+
+    def __call__(self, resource, event_type, obj):
+        self._loop.call_soon_threadsafe(self._put, (resource, event_type, obj))
+
+    def _put(self, event):
         try:
-            return _deployment_status(apps_api.read_namespaced_deployment(name=app_name, namespace=namespace),
-                                      core_api, namespace)
-        except ApiException as e:
-            if e.status == 404:
-                return {"error": f"Deployment {app_name} not found in namespace {namespace}"}
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+_event_subscribers = 0
+
+
+def _parse_event_id(event_id):
+    """(deployments, pods) resourceVersions of an event ID; a single resourceVersion applies to both."""
+    if not event_id:
+        return None, None
+    deployments_version, _, pods_version = event_id.partition(".")
+    return deployments_version, pods_version or deployments_version
+
+
+async def api_deployment_events(namespace, last_event_id=None):
+    """Server-sent events with the deployment and pod changes of a namespace, resuming after ``last_event_id``.
+
+    Every client shares the namespace's informer watches. Event IDs are ``<deployments rv>.<pods rv>``.
+    Without a usable ``last_event_id``, the stream starts with every deployment as an ADDED event
+    (after a ``reset`` event when the ID was given but is too old to resume from).
+    """
+    loop = asyncio.get_running_loop()
+    deployments = await loop.run_in_executor(None, _get_informer, "deployments", namespace)
+    pods = await loop.run_in_executor(None, _get_informer, "pods", namespace)
+    autoscalers = await loop.run_in_executor(None, _get_autoscalers, namespace)
+
+    def message(event, data, versions):
+        return (f"id: {versions['deployments']}.{versions['pods']}\nevent: {event}\n".encode()
+                + b"data: " + orjson.dumps(data) + b"\n\n")
+
+    def change(resource, event_type, obj, versions):
+        versions[resource] = obj.metadata.resource_version
+        if resource == "deployments":
+            status = _deployment_status(obj, pods.by_app(obj.metadata.name), autoscalers)
+            return message("deployment", {"type": event_type, "object": status}, versions)
+        deployment = (obj.metadata.labels or {}).get("app")
+        return message("pod", {"type": event_type, "deployment": deployment, "object": obj.status}, versions)
+
+    async def generate():
+        global _event_subscribers
+        _event_subscribers += 1
+        SSE_SUBSCRIBERS.inc()
+        subscription = _EventSubscription()
+        try:
+            after = _parse_event_id(last_event_id)
+            deployments_version, deployment_changes = deployments.subscribe(subscription, after[0])
+            pods_version, pod_changes = pods.subscribe(subscription, after[1])
+            versions = {"deployments": deployments_version, "pods": pods_version}
+
+            if deployment_changes is None or pod_changes is None:
+                yield message("reset", {"reason": "the last event ID is too old to resume from"}, versions)
+            if deployment_changes is None or pod_changes is None or not last_event_id:
+                for deployment in deployments.list():
+                    status = _deployment_status(deployment, pods.by_app(deployment.metadata.name), autoscalers)
+                    yield message("deployment", {"type": "ADDED", "object": status}, versions)
             else:
-                return {"error": str(e)}
-    else:
-        deployments = apps_api.list_namespaced_deployment(namespace=namespace)
-        all_deployment_status = []
-        for deployment in deployments.items:
-            all_deployment_status.append(_deployment_status(deployment, core_api, namespace))
-
-    return all_deployment_status
+                # IDs of replayed events count up from the client's ID, so a reconnect mid-replay loses nothing.
+                versions = {"deployments": after[0], "pods": after[1]}
+                for event in deployment_changes + pod_changes:
+                    yield change(*event, versions)
+
+            while not subscription.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield change(*event, versions)
+        finally:
+            deployments.unsubscribe(subscription)
+            pods.unsubscribe(subscription)
+            _event_subscribers -= 1
+            SSE_SUBSCRIBERS.dec()
+
+    return generate()
+
+
+# Workload profiles: (max_connections, maintenance_work_mem divisor, min/max WAL size in MB, statistics target)
+_POSTGRES_PROFILES = {
+    "web": (200, 16, 1024, 4096, 100),
+    "oltp": (300, 16, 2048, 8192, 100),
+    "dw": (40, 8, 4096, 16384, 500),
+    "mixed": (100, 16, 1024, 4096, 100),
+}
+
+# PostgreSQL refuses to start with min_wal_size below two WAL segments of the default 16MB
+_POSTGRES_MIN_WAL_MB = 32
+
+
+def _postgres_tuning(resources, profile="mixed", storage=None):
+    """postgresql.conf settings sized for the requested memory, CPU and storage, following the pgtune rules."""
+    memory_mb = int(parse_quantity(resources['memory']) / 1024 ** 2)
+    cpus = max(1, math.ceil(parse_quantity(resources['cpu'])))
+    max_connections, maintenance_divisor, min_wal_mb, max_wal_mb, statistics_target = _POSTGRES_PROFILES[profile]
+
+    shared_buffers_mb = max(memory_mb // 4, 16)
+    workers_per_gather = max(1, cpus // 2)
+    # Every connection may run a few sorts or hashes at once, each parallel worker with its own work_mem.
+    work_mem_kb = (memory_mb - shared_buffers_mb) * 1024 // (max_connections * 3) // workers_per_gather
+    if profile == "mixed":
+        work_mem_kb //= 2
+    if storage:
+        # Leave most of the volume for data; WAL may grow up to max_wal_size between checkpoints.
+        storage_mb = int(parse_quantity(storage) / 1024 ** 2)
+        max_wal_mb = max(min(max_wal_mb, storage_mb // 4), 2 * _POSTGRES_MIN_WAL_MB)
+        min_wal_mb = max(min(min_wal_mb, max_wal_mb // 4), _POSTGRES_MIN_WAL_MB)
+
+    return {
+        "listen_addresses": "'*'",
+        "max_connections": max_connections,
+        "shared_buffers": f"{shared_buffers_mb}MB",
+        "effective_cache_size": f"{max(memory_mb * 3 // 4, 1)}MB",
+        "maintenance_work_mem": f"{max(min(memory_mb // maintenance_divisor, 2048), 1)}MB",
+        "work_mem": f"{max(work_mem_kb, 64)}kB",
+        "wal_buffers": f"{min(max(shared_buffers_mb * 1024 * 3 // 100, 32), 16384)}kB",
+        "min_wal_size": f"{min_wal_mb}MB",
+        "max_wal_size": f"{max_wal_mb}MB",
+        "checkpoint_completion_target": 0.9,
+        "default_statistics_target": statistics_target,
+        "random_page_cost": 1.1,
+        "effective_io_concurrency": 200,
+        "max_worker_processes": max(cpus, 8),
+        "max_parallel_workers": cpus,
+        "max_parallel_workers_per_gather": workers_per_gather,
+        "max_parallel_maintenance_workers": workers_per_gather,
+    }
 
 
-def _create_configmap(api_instance, namespace, configmap_name, config_data):
+def _pgbouncer_config(max_connections):
+    """pgbouncer.ini for a sidecar that pools client connections in transaction mode."""
+    # Keep a few server connections free for superusers and maintenance.
+    pool_size = max(max_connections - 10, 5)
+    return "\n".join([
+        "[databases]",
+        "* = host=127.0.0.1 port=5432",
+        "",
+        "[pgbouncer]",
+        "listen_addr = 0.0.0.0",
+        "listen_port = 6432",
+        "auth_type = scram-sha-256",
+        "auth_file = /etc/pgbouncer/userlist.txt",
+        "pool_mode = transaction",
+        f"max_client_conn = {PGBOUNCER_MAX_CLIENT_CONN}",
+        f"default_pool_size = {pool_size}",
+        "ignore_startup_parameters = extra_float_digits",
+    ])
+
+
+@_traced
+def _create_configmap(api_instance, namespace, configmap_name, config_data, apply=False):
     configmap = client.V1ConfigMap(
         metadata=client.V1ObjectMeta(name=configmap_name),
         data=config_data
     )
-    api_instance.create_namespaced_config_map(namespace, configmap)
+    return _submit(api_instance, "config_map", namespace, configmap, apply)
 
 
-def _create_statefulset(api_instance, namespace, app_name, image, resources, configmap_name, secret_name, external):
+@_traced
+def _create_statefulset(api_instance, namespace, app_name, image, resources, configmap_name, secret_name, external,
+                        apply=False, storage=None, storage_class=None, pgbouncer=False, config_hash=None):
     env = [
         client.V1EnvVar(
             name="POSTGRES_USER",
@@ -340,19 +2301,60 @@ def _create_statefulset(api_instance, namespace, app_name, image, resources, con
         )
     ]
 
+    volume_claim_templates = []
+    if storage:
+        # A subdirectory keeps initdb away from the lost+found directory at the volume root.
+        env.append(client.V1EnvVar(name="PGDATA", value="/var/lib/postgresql/data/pgdata"))
+        volume_mounts.append(client.V1VolumeMount(name="data", mount_path="/var/lib/postgresql/data"))
+        volume_claim_templates.append(client.V1PersistentVolumeClaim(
+            metadata=client.V1ObjectMeta(name="data"),
+            spec=client.V1PersistentVolumeClaimSpec(
+                access_modes=["ReadWriteOnce"],
+                storage_class_name=storage_class,
+                # Clients before v29 call the claim's resources V1ResourceRequirements.
+                resources=getattr(client, "V1VolumeResourceRequirements", client.V1ResourceRequirements)(
+                    requests={"storage": storage}
+                )
+            )
+        ))
+
     container = client.V1Container(
         name=app_name,
         image=image,
+        args=["-c", "config_file=/etc/postgresql/postgresql.conf"],
         resources=client.V1ResourceRequirements(
             requests=resources
         ),
         env=env,
         volume_mounts=volume_mounts
     )
-
+    containers = [container]
+
+    if pgbouncer:
+        containers.append(client.V1Container(
+            name="pgbouncer",
+            image=PGBOUNCER_IMAGE,
+            ports=[client.V1ContainerPort(container_port=6432, name="pgbouncer")],
+            resources=client.V1ResourceRequirements(
+                requests={"cpu": "50m", "memory": "32Mi"}
+            ),
+            volume_mounts=[
+                client.V1VolumeMount(name="postgres-config", mount_path="/etc/pgbouncer/pgbouncer.ini",
+                                     sub_path="pgbouncer.ini"),
+                client.V1VolumeMount(name="pgbouncer-users", mount_path="/etc/pgbouncer/userlist.txt",
+                                     sub_path="userlist.txt")
+            ]
+        ))
+        volumes.append(client.V1Volume(
+            name="pgbouncer-users",
+            secret=client.V1SecretVolumeSource(secret_name=secret_name)
+        ))
+
+    # Settings like shared_buffers need a restart, so a new configuration rolls the pod.
+    annotations = {"kaas/config-hash": config_hash} if config_hash else None
     template = client.V1PodTemplateSpec(
-        metadata=client.V1ObjectMeta(labels={"app": app_name}),
-        spec=client.V1PodSpec(containers=[container], volumes=volumes)
+        metadata=client.V1ObjectMeta(labels={"app": app_name}, annotations=annotations),
+        spec=client.V1PodSpec(containers=containers, volumes=volumes)
     )
 
     spec = client.V1StatefulSetSpec(
@@ -360,7 +2362,7 @@ def _create_statefulset(api_instance, namespace, app_name, image, resources, con
         replicas=1,
         selector={'matchLabels': {'app': app_name}},
         template=template,
-        volume_claim_templates=[]
+        volume_claim_templates=volume_claim_templates
     )
 
     statefulset = client.V1StatefulSet(
@@ -370,14 +2372,14 @@ def _create_statefulset(api_instance, namespace, app_name, image, resources, con
         spec=spec
     )
 
-    api_instance.create_namespaced_stateful_set(namespace, statefulset)
+    return _submit(api_instance, "stateful_set", namespace, statefulset, apply)
 
 
-def api_create_postgres_service(app_data: PostgresAppData):
+async def api_create_postgres_service(app_data: PostgresAppData, apply=False, on_step=None):
     namespace = 'default'
-    api_instance = client.CoreV1Api()
-    apps_api = client.AppsV1Api()
-    networking_v1_api = client.NetworkingV1Api()
+    api_instance = client.CoreV1Api(api_client)
+    apps_api = client.AppsV1Api(api_client)
+    networking_v1_api = client.NetworkingV1Api(api_client)
 
     app_name = app_data.AppName
     resources = {
@@ -388,157 +2390,1149 @@ def api_create_postgres_service(app_data: PostgresAppData):
     secret_name = f"{app_name}-secret"
     configmap_name = f"{app_name}-config"
 
+    provisioner = _Provisioner(on_step=on_step)
+
     secret_data = {
         "POSTGRES_USER": "admin",
         "POSTGRES_PASSWORD": "adminpass"
     }
-    _create_secret(api_instance, namespace, secret_name, secret_data)
-
+    tuning = _postgres_tuning(resources, app_data.Profile, app_data.Storage)
     config_data = {
-        "postgresql.conf": "shared_buffers = 128MB\nmax_connections = 100"
+        "postgresql.conf": "\n".join(f"{key} = {value}" for key, value in tuning.items())
     }
-    _create_configmap(api_instance, namespace, configmap_name, config_data)
+    if app_data.PgBouncer:
+        secret_data["userlist.txt"] = f'"{secret_data["POSTGRES_USER"]}" "{secret_data["POSTGRES_PASSWORD"]}"'
+        config_data["pgbouncer.ini"] = _pgbouncer_config(tuning["max_connections"])
+    config_hash = hashlib.sha1(json.dumps(config_data, sort_keys=True).encode()).hexdigest()[:16]
+
+    provisioner.add(
+        "secret",
+        lambda: _create_secret(api_instance, namespace, secret_name, secret_data, apply),
+        lambda: api_instance.delete_namespaced_secret(secret_name, namespace)
+    )
+
+    provisioner.add(
+        "configmap",
+        lambda: _create_configmap(api_instance, namespace, configmap_name, config_data, apply),
+        lambda: api_instance.delete_namespaced_config_map(configmap_name, namespace)
+    )
 
-    _create_statefulset(apps_api, namespace, app_name, image, resources, configmap_name, secret_name, app_data.External)
+    provisioner.add(
+        "statefulset",
+        lambda: _create_statefulset(apps_api, namespace, app_name, image, resources, configmap_name, secret_name,
+                                    app_data.External, apply, app_data.Storage, app_data.StorageClass,
+                                    app_data.PgBouncer, config_hash),
+        lambda: apps_api.delete_namespaced_stateful_set(app_name, namespace, propagation_policy="Background"),
+        after=("secret", "configmap")
+    )
 
-    _create_service(api_instance, namespace, app_name, 5432)
+    provisioner.add(
+        "service",
+        lambda: _create_service(api_instance, namespace, app_name, 5432, apply,
+                                extra_ports=[6432] if app_data.PgBouncer else ()),
+        lambda: api_instance.delete_namespaced_service(app_name, namespace)
+    )
 
     if app_data.External:
-        _create_ingress(networking_v1_api, namespace, app_name, f"{app_name}.example.com")
+        provisioner.add(
+            "ingress",
+            lambda: _create_ingress(networking_v1_api, namespace, app_name, f"{app_name}.example.com", apply),
+            lambda: networking_v1_api.delete_namespaced_ingress(app_name, namespace)
+        )
 
+    await provisioner.wait()
+    return provisioner.results
+
+
+def _queue_application(app_data: AppData):
+    """Payload to queue for an application, without its secret values.
+
+    Secret values never go to the operations table: the application's Secret is created
+    right away, and the queued operation only references it. Creating it fails with 409 when
+    the Secret exists already, so a queued operation never takes over another application's Secret.
+    """
+    secret_data = {env.Key: env.Value for env in app_data.Envs if env.IsSecret}
+    if secret_data:
+        _create_secret(client.CoreV1Api(api_client), 'default', f"{app_data.AppName}-secret", secret_data)
+    payload = jsonable_encoder(app_data)
+    for env in payload["Envs"]:
+        if env["IsSecret"]:
+            env["Value"] = ""
+    return payload
 
-def api_health(app_name: str):
-    namespace = 'default'
-    db_config = _get_db_config(namespace)
 
-    connection = None
+async def _provision_queued_application(app_data: AppData, apply=False, on_step=None):
+    return await api_add_new_application(app_data, apply=apply, on_step=on_step, secret_written=True)
+
+
+def _discard_queued_application(app_data: AppData):
+    """Delete the Secret created when the application was queued, once the operation has failed for good.
+
+    Queueing only succeeds when it created the Secret, so the Secret deleted here is always the operation's own.
+    """
+    if any(env.IsSecret for env in app_data.Envs):
+        try:
+            client.CoreV1Api(api_client).delete_namespaced_secret(f"{app_data.AppName}-secret", 'default')
+        except ApiException as e:
+            if e.status != 404:
+                raise
+
+
+_OperationKind = collections.namedtuple("_OperationKind", ["model", "provision", "prepare", "discard"])
+
+# Of each operation kind: the payload model, the provisioning function, the function that turns
+# a request into the payload to store, and the cleanup for an operation that failed for good
+_OPERATION_KINDS = {
+    "application": _OperationKind(AppData, _provision_queued_application, _queue_application,
+                                  _discard_queued_application),
+    "postgres": _OperationKind(PostgresAppData, api_create_postgres_service, jsonable_encoder, None),
+}
+
+
+def api_enqueue_operation(kind, data):
+    """Queue a provisioning operation and return its ID."""
+    operation_id = str(uuid.uuid4())
+    operation_kind = _OPERATION_KINDS[kind]
+    payload = operation_kind.prepare(data)
     try:
-        # Connect to the PostgreSQL database
-        connection = psycopg2.connect(
-            host=db_config['DB_HOST_SLAVE'],
-            port=db_config['DB_PORT'],
-            database=db_config['DB_NAME'],
-            user=db_config['DB_USER'],
-            password=db_config['DB_PASSWORD']
-        )
+        with _get_db_pool('master').connection() as connection:
+            cursor = connection.cursor()
+            start_time = time.perf_counter()
+            cursor.execute("INSERT INTO operations (id, kind, payload, trace_parent) VALUES (%s, %s, %s, %s)",
+                           (operation_id, kind, json.dumps(payload), _current_traceparent()))
+            connection.commit()
+            DB_RESPONSE_TIME.labels(path='insert operation').observe(time.perf_counter() - start_time)
+    except Exception:
+        DB_ERROR_COUNT.labels(path='insert operation').inc()
+        if operation_kind.discard is not None:
+            operation_kind.discard(data)
+        raise
+    OPERATION_COUNT.labels(kind=kind, result='queued').inc()
+    _operation_workers.wake()
+    return operation_id
+
+
+def api_get_operation(operation_id):
+    try:
+        uuid.UUID(operation_id)
+    except ValueError:
+        return None
+    try:
+        # Read from the master, the slave may not have the operation or its latest progress yet.
+        with _get_db_pool('master').connection() as connection:
+            cursor = connection.cursor()
+            start_time = time.perf_counter()
+            cursor.execute('''
+                SELECT id, kind, status, steps, result, error, attempts, next_attempt_at, created_at, updated_at
+                FROM operations WHERE id = %s
+            ''', (operation_id,))
+            row = cursor.fetchone()
+            DB_RESPONSE_TIME.labels(path='select operation').observe(time.perf_counter() - start_time)
+    except Exception:
+        DB_ERROR_COUNT.labels(path='select operation').inc()
+        raise
+    if row is None:
+        return None
+    operation_id, kind, status, steps, result, error, attempts, next_attempt_at, created_at, updated_at = row
+    return {
+        "id": operation_id,
+        "kind": kind,
+        "status": status,
+        "steps": steps,
+        "result": result,
+        "error": error,
+        "attempts": attempts,
+        "next_attempt_at": next_attempt_at if status == "pending" else None,
+        "created_at": created_at,
+        "updated_at": updated_at
+    }
+
 
+def _claim_operation():
+    """Lease the next due operation; returns (id, kind, payload, attempts, seconds queued, traceparent) or None."""
+    with _get_db_pool('master').connection() as connection:
         cursor = connection.cursor()
-        # Query the health_status table for the specified app_name
         start_time = time.perf_counter()
-        cursor.execute("SELECT * FROM health_status WHERE app_name = %s", (app_name,))
-        result = cursor.fetchone()
-        process_time = (time.perf_counter() - start_time) * 1000
-        DB_RESPONSE_TIME.labels(path='select').set(process_time)
-
-        if result:
-            return {
-                "app_name": result[0],
-                "failure_count": result[1],
-                "success_count": result[2],
-                "last_failure": result[3],
-                "last_success": result[4],
-                "created_at": result[5]
-            }
+        cursor.execute('''
+            UPDATE operations
+            SET status = 'running', attempts = attempts + 1, steps = '{}',
+                locked_until = now() + %s * interval '1 second', updated_at = now()
+            WHERE id = (
+                SELECT id FROM operations
+                WHERE status IN ('pending', 'running') AND next_attempt_at <= now()
+                  AND (locked_until IS NULL OR locked_until < now())
+                ORDER BY next_attempt_at
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, kind, payload, attempts, extract(epoch FROM now() - created_at), trace_parent
+        ''', (OPERATION_LEASE_SECONDS,))
+        row = cursor.fetchone()
+        connection.commit()
+        DB_RESPONSE_TIME.labels(path='claim operation').observe(time.perf_counter() - start_time)
+    return row
+
+
+def _update_operation_step(operation_id, step, state):
+    with _get_db_pool('master').connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute('''
+            UPDATE operations SET steps = steps || jsonb_build_object(%s::text, %s::text), updated_at = now()
+            WHERE id = %s
+        ''', (step, state, operation_id))
+        connection.commit()
+
+
+def _finish_operation(operation_id, status, result=None, error=None, retry_in=None):
+    """Record the outcome of an attempt; with ``retry_in`` the operation is queued again after that many seconds."""
+    with _get_db_pool('master').connection() as connection:
+        cursor = connection.cursor()
+        if retry_in is not None:
+            cursor.execute('''
+                UPDATE operations
+                SET status = 'pending', error = %s, locked_until = NULL,
+                    next_attempt_at = now() + %s * interval '1 second', updated_at = now()
+                WHERE id = %s
+            ''', (error, retry_in, operation_id))
         else:
-            return {"status": "No health status found for the application"}
+            # A finished operation's request is not needed any more.
+            cursor.execute('''
+                UPDATE operations
+                SET status = %s, result = %s, error = %s, payload = '{}', locked_until = NULL, updated_at = now()
+                WHERE id = %s
+            ''', (status, json.dumps(result) if result is not None else None, error, operation_id))
+        connection.commit()
+
+
+def _delete_expired_operations():
+    with _get_db_pool('master').connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute('''
+            DELETE FROM operations
+            WHERE status IN ('succeeded', 'failed') AND updated_at < now() - %s * interval '1 day'
+        ''', (OPERATION_RETENTION_DAYS,))
+        connection.commit()
+
+
+def _is_retryable(error):
+    # Invalid input, and requests the API server rejected as invalid or forbidden, fail the same way on every attempt.
+    # A 409 on a create means the object belongs to someone else; a retry would apply over it.
+    if isinstance(error, ValueError):
+        return False
+    return not (isinstance(error, ApiException) and error.status in (400, 401, 403, 404, 409, 422))
+
+
+class _OperationWorkers:
+    """Runs queued provisioning operations from the ``operations`` table.
+
+    ``OPERATION_WORKERS`` tasks per process claim operations with ``FOR UPDATE SKIP LOCKED``,
+    so every replica and worker process can share the queue. A claim is a lease: if the process
+    dies mid-operation, it is claimed again once ``OPERATION_LEASE_SECONDS`` have passed.
+    Failed attempts are retried with exponential backoff up to ``OPERATION_MAX_ATTEMPTS`` times;
+    retries apply instead of create, so objects left behind by an earlier attempt are reconciled.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._wakeup = None
+        self._tasks = []
+
+    def start(self):
+        if OPERATION_WORKERS < 1:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._run()) for _ in range(OPERATION_WORKERS)]
+        self._tasks.append(asyncio.ensure_future(self._expire()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @staticmethod
+    async def _wait_for_tables():
+        while not _tables_ready.is_set():
+            await asyncio.sleep(1)
+
+    def wake(self):
+        """Wake an idle worker from any thread, so a new operation does not wait for the next poll."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        await self._wait_for_tables()
+        while True:
+            self._wakeup.clear()
+            try:
+                operation = await loop.run_in_executor(None, _claim_operation)
+                if operation is not None:
+                    await self._process(*operation)
+                    continue
+            except Exception as e:
+                logger.error(f"operations: worker failed because {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OPERATION_POLL_SECONDS * random.uniform(0.5, 1.5))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, operation_id, kind, payload, attempts, queued_seconds, trace_parent=None):
+        # The operation continues the trace of the request that queued it.
+        with _trace(f"operation {kind}", _SPAN_CONSUMER, trace_parent, operation_id=operation_id, attempt=attempts):
+            await self._attempt(operation_id, kind, payload, attempts, queued_seconds)
+
+    async def _attempt(self, operation_id, kind, payload, attempts, queued_seconds):
+        loop = asyncio.get_running_loop()
+        if attempts == 1:
+            OPERATION_QUEUE_WAIT.labels(kind=kind).observe(float(queued_seconds))
+        operation_kind = _OPERATION_KINDS[kind]
+        data = operation_kind.model(**payload)
+        try:
+            result = await operation_kind.provision(
+                data, apply=attempts > 1,
+                on_step=lambda step, state: _update_operation_step(operation_id, step, state))
+        except Exception as e:
+            retry_in = None
+            if attempts < OPERATION_MAX_ATTEMPTS and _is_retryable(e):
+                backoff = OPERATION_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+                retry_in = min(backoff, OPERATION_RETRY_MAX_BACKOFF_SECONDS) * random.uniform(0.8, 1.2)
+            OPERATION_COUNT.labels(kind=kind, result='failed' if retry_in is None else 'retried').inc()
+            logger.error(f"operations: {kind} operation {operation_id} attempt {attempts} failed because {e}")
+            if retry_in is None and operation_kind.discard is not None:
+                try:
+                    await loop.run_in_executor(None, _in_context(operation_kind.discard, data))
+                except Exception as discard_error:
+                    logger.error(f"operations: failed to clean up {kind} operation {operation_id} "
+                                 f"because {discard_error}")
+            await loop.run_in_executor(None, _in_context(_finish_operation, operation_id, 'failed', None, str(e),
+                                                         retry_in))
+            return
+        OPERATION_COUNT.labels(kind=kind, result='succeeded').inc()
+        await loop.run_in_executor(None, _in_context(_finish_operation, operation_id, 'succeeded', result))
+
+    async def _expire(self):
+        loop = asyncio.get_running_loop()
+        await self._wait_for_tables()
+        while True:
+            try:
+                await loop.run_in_executor(None, _delete_expired_operations)
+            except Exception as e:
+                logger.error(f"operations: failed to delete expired operations because {e}")
+            await asyncio.sleep(3600)
+
+
+_operation_workers = _OperationWorkers()
+
+
+_health_cache = {}
+_health_cache_lock = threading.Lock()
+
+
+def _fetch_health_rows(app_names):
+    """health_status rows by app name (None when missing), cached for ``HEALTH_CACHE_TTL_SECONDS``.
+
+    Every app that is not cached is read with one ``ANY`` query, on the host the read router picks.
+    """
+    now = time.monotonic()
+    rows = {}
+    with _health_cache_lock:
+        for app_name in app_names:
+            cached = _health_cache.get(app_name)
+            if cached is not None and cached[0] > now:
+                rows[app_name] = cached[1]
+    missing = [app_name for app_name in app_names if app_name not in rows]
+    if not missing:
+        return rows
+
+    with _read_connection() as connection:
+        cursor = connection.cursor()
+        # Query the health_status table for the specified app names
+        start_time = time.perf_counter()
+        cursor.execute(
+            "SELECT app_name, failure_count, success_count, last_failure, last_success, created_at "
+            "FROM health_status WHERE app_name = ANY(%s)",
+            (missing,)
+        )
+        found = {result[0]: result for result in cursor.fetchall()}
+        process_time = time.perf_counter() - start_time
+        DB_RESPONSE_TIME.labels(path='select').observe(process_time)
+
+    expires = time.monotonic() + HEALTH_CACHE_TTL_SECONDS
+    with _health_cache_lock:
+        for app_name in missing:
+            rows[app_name] = found.get(app_name)
+            _health_cache[app_name] = (expires, rows[app_name])
+        # Evict expired entries so the cache stays the size of the working set.
+        for app_name in [key for key, (expiry, _) in _health_cache.items() if expiry <= now]:
+            del _health_cache[app_name]
+    return rows
+
+
+def _health_status(result):
+    if result:
+        return {
+            "app_name": result[0],
+            "failure_count": result[1],
+            "success_count": result[2],
+            "last_failure": result[3],
+            "last_success": result[4],
+            "created_at": result[5]
+        }
+    else:
+        return {"status": "No health status found for the application"}
+
+
+def _health_etag(result):
+    """ETag of a health_status row, from its counters and the times of its last success and failure."""
+    if not result:
+        return None
+    digest = hashlib.sha1(f"{result[1]}|{result[2]}|{result[3]}|{result[4]}".encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def api_health_etag(app_name: str):
+    """ETag of an application's health status; None when it has no status or the lookup fails.
+
+    The row comes from the health cache, so the body built right after reads the same row.
+    """
+    try:
+        return _health_etag(_fetch_health_rows([app_name])[app_name])
+    except Exception:
+        return None
+
+
+def api_health(app_name: str):
+    try:
+        return _health_status(_fetch_health_rows([app_name])[app_name])
 
     except Exception as e:
         DB_ERROR_COUNT.labels(path='select').inc()
         return {"status": "unhealthy", "details": str(e)}
 
-    finally:
-        if connection:
-            connection.close()
+
+def api_health_bulk(app_names):
+    try:
+        rows = _fetch_health_rows(app_names)
+        return {app_name: _health_status(rows[app_name]) for app_name in app_names}
+
+    except Exception as e:
+        DB_ERROR_COUNT.labels(path='select').inc()
+        return {"status": "unhealthy", "details": str(e)}
+
+
+_STEP_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _parse_step(step):
+    """Seconds in a step given as plain seconds or with an s/m/h/d suffix, e.g. ``300`` or ``5m``."""
+    if step[-1:] in _STEP_UNITS:
+        seconds = int(step[:-1]) * _STEP_UNITS[step[-1]]
+    else:
+        seconds = int(step)
+    if seconds < 60:
+        raise ValueError("step must be at least one minute")
+    return seconds
 
 
+def api_health_history(app_name, start, end, step):
+    """Availability of an app per ``step`` seconds between ``start`` and ``end``, read from the rollups."""
+    # Hour rollups are enough when every step spans whole hours.
+    table = "health_history_1h" if step % 3600 == 0 else "health_history_1m"
+    with _read_connection() as connection:
+        cursor = connection.cursor()
+        start_time = time.perf_counter()
+        cursor.execute(f'''
+            SELECT to_timestamp(floor(extract(epoch FROM bucket) / %s) * %s) AT TIME ZONE 'UTC' AS point,
+                   sum(success_count), sum(failure_count)
+            FROM {table}
+            WHERE app_name = %s AND bucket >= %s AND bucket < %s
+            GROUP BY point ORDER BY point
+        ''', (step, step, app_name, start, end))
+        rows = cursor.fetchall()
+        process_time = time.perf_counter() - start_time
+        DB_RESPONSE_TIME.labels(path='history').observe(process_time)
+
+    return {
+        "app_name": app_name,
+        "from": start,
+        "to": end,
+        "step": step,
+        "points": [
+            {
+                "time": point,
+                "success_count": successes,
+                "failure_count": failures,
+                "availability": successes / (successes + failures) if successes + failures else None
+            }
+            for point, successes, failures in rows
+        ]
+    }
+
+
+@_traced
 def create_health_status_table():
-    namespace = 'default'
-    db_config = _get_db_config(namespace)
+    try:
+        with _get_db_pool('master').connection() as connection:
+            cursor = connection.cursor()
+
+            # SQL to create the health_status table
+            start_time = time.perf_counter()
+            create_table_query = '''
+            CREATE TABLE IF NOT EXISTS health_status (
+                app_name VARCHAR(255) PRIMARY KEY,
+                failure_count INT NOT NULL,
+                success_count INT NOT NULL,
+                last_failure TIMESTAMP,
+                last_success TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            '''
+            cursor.execute(create_table_query)
+            connection.commit()
+            process_time = time.perf_counter() - start_time
+            DB_RESPONSE_TIME.labels(path='create table').observe(process_time)
+        return True
+
+    except Exception as e:
+        DB_ERROR_COUNT.labels(path='create table').inc()
+        print(f"Error creating table: {e}")
+        return False
+
 
-    connection = None
+@_traced
+def create_operations_table():
     try:
-        connection = psycopg2.connect(
-            host=db_config['DB_HOST'],
-            port=db_config['DB_PORT'],
-            database=db_config['DB_NAME'],
-            user=db_config['DB_USER'],
-            password=db_config['DB_PASSWORD']
-        )
+        with _get_db_pool('master').connection() as connection:
+            cursor = connection.cursor()
+            start_time = time.perf_counter()
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS operations (
+                id UUID PRIMARY KEY,
+                kind VARCHAR(32) NOT NULL,
+                payload JSONB NOT NULL,
+                status VARCHAR(16) NOT NULL DEFAULT 'pending',
+                steps JSONB NOT NULL DEFAULT '{}',
+                result JSONB,
+                error TEXT,
+                attempts INT NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP NOT NULL DEFAULT now(),
+                locked_until TIMESTAMP,
+                created_at TIMESTAMP NOT NULL DEFAULT now(),
+                updated_at TIMESTAMP NOT NULL DEFAULT now()
+            );
+            ALTER TABLE operations ADD COLUMN IF NOT EXISTS trace_parent TEXT;
+            CREATE INDEX IF NOT EXISTS operations_due_idx ON operations (next_attempt_at)
+                WHERE status IN ('pending', 'running');
+            ''')
+            connection.commit()
+            DB_RESPONSE_TIME.labels(path='create table').observe(time.perf_counter() - start_time)
+        return True
+
+    except Exception as e:
+        DB_ERROR_COUNT.labels(path='create table').inc()
+        logger.error(f"operations: failed to create table because {e}")
+        return False
+
+
+# Partitioned history tables: name -> (partition column, partition span, retention in days)
+_HEALTH_HISTORY_TABLES = {
+    "health_history_raw": ("ts", "day", HEALTH_HISTORY_RAW_RETENTION_DAYS),
+    "health_history_1m": ("bucket", "day", HEALTH_HISTORY_1M_RETENTION_DAYS),
+    "health_history_1h": ("bucket", "month", HEALTH_HISTORY_1H_RETENTION_DAYS),
+}
+
+# Advisory lock key that keeps history maintenance to one replica at a time
+_HEALTH_HISTORY_LOCK_KEY = 0x6b616173
+
 
+@_traced
+def create_health_history_tables():
+    try:
+        with _get_db_pool('master').connection() as connection:
+            cursor = connection.cursor()
+            start_time = time.perf_counter()
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS health_history_raw (
+                app_name VARCHAR(255) NOT NULL,
+                ts TIMESTAMP NOT NULL,
+                healthy BOOLEAN NOT NULL
+            ) PARTITION BY RANGE (ts);
+            CREATE INDEX IF NOT EXISTS health_history_raw_ts_idx ON health_history_raw (ts);
+            CREATE TABLE IF NOT EXISTS health_history_1m (
+                app_name VARCHAR(255) NOT NULL,
+                bucket TIMESTAMP NOT NULL,
+                success_count INT NOT NULL,
+                failure_count INT NOT NULL,
+                PRIMARY KEY (app_name, bucket)
+            ) PARTITION BY RANGE (bucket);
+            CREATE TABLE IF NOT EXISTS health_history_1h (
+                app_name VARCHAR(255) NOT NULL,
+                bucket TIMESTAMP NOT NULL,
+                success_count INT NOT NULL,
+                failure_count INT NOT NULL,
+                PRIMARY KEY (app_name, bucket)
+            ) PARTITION BY RANGE (bucket);
+            CREATE TABLE IF NOT EXISTS health_history_1m_default PARTITION OF health_history_1m DEFAULT;
+            CREATE TABLE IF NOT EXISTS health_history_1h_default PARTITION OF health_history_1h DEFAULT;
+            CREATE TABLE IF NOT EXISTS health_history_raw_default PARTITION OF health_history_raw DEFAULT;
+            CREATE TABLE IF NOT EXISTS health_history_rollups (
+                name VARCHAR(64) PRIMARY KEY,
+                watermark TIMESTAMP NOT NULL
+            );
+            ''')
+            _create_health_history_partitions(cursor, datetime.datetime.utcnow())
+            connection.commit()
+            process_time = time.perf_counter() - start_time
+            DB_RESPONSE_TIME.labels(path='create table').observe(process_time)
+        return True
+
+    except Exception as e:
+        DB_ERROR_COUNT.labels(path='create table').inc()
+        logger.error(f"health history: failed to create tables because {e}")
+        return False
+
+
+def _partition_bounds(span, moment):
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if span == "day":
+        return start, start + datetime.timedelta(days=1), start.strftime("%Y%m%d")
+    start = start.replace(day=1)
+    return start, (start + datetime.timedelta(days=32)).replace(day=1), start.strftime("%Y%m")
+
+
+def _create_health_history_partitions(cursor, now):
+    """Make sure every history table has a partition for today and for tomorrow."""
+    for table, (_, span, _) in _HEALTH_HISTORY_TABLES.items():
+        for moment in (now, now + datetime.timedelta(days=1)):
+            start, end, suffix = _partition_bounds(span, moment)
+            cursor.execute("SAVEPOINT partition")
+            try:
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table}_p{suffix} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+                    (start, end)
+                )
+                cursor.execute("RELEASE SAVEPOINT partition")
+            except psycopg2.Error as e:
+                # Usually rows for this range already sit in the default partition.
+                cursor.execute("ROLLBACK TO SAVEPOINT partition")
+                logger.error(f"health history: cannot create {table}_p{suffix} because {e}")
+
+
+def _drop_expired_health_history_partitions(cursor, now):
+    for table, (_, span, retention_days) in _HEALTH_HISTORY_TABLES.items():
+        cutoff = now - datetime.timedelta(days=retention_days)
+        cursor.execute('''
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            WHERE parent.relname = %s
+        ''', (table,))
+        for (partition,) in cursor.fetchall():
+            suffix = partition.rsplit("_p", 1)[-1]
+            if not suffix.isdigit():
+                continue
+            start = datetime.datetime.strptime(suffix, "%Y%m%d" if span == "day" else "%Y%m")
+            _, end, _ = _partition_bounds(span, start)
+            if end <= cutoff:
+                cursor.execute(f"DROP TABLE IF EXISTS {partition}")
+                logger.info(f"health history: dropped expired partition {partition}")
+
+
+def _rollup_health_history(cursor, name, source, target, unit, upto):
+    """Fold every source row below ``upto`` that was not rolled up yet into ``unit`` buckets of the target."""
+    cursor.execute("SELECT watermark FROM health_history_rollups WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    since = row[0] if row else datetime.datetime.min
+    if since >= upto:
+        return
+    if source == "health_history_raw":
+        select = f'''
+            SELECT app_name, date_trunc('{unit}', ts),
+                   count(*) FILTER (WHERE healthy), count(*) FILTER (WHERE NOT healthy)
+            FROM health_history_raw WHERE ts >= %s AND ts < %s GROUP BY 1, 2
+        '''
+    else:
+        select = f'''
+            SELECT app_name, date_trunc('{unit}', bucket), sum(success_count), sum(failure_count)
+            FROM {source} WHERE bucket >= %s AND bucket < %s GROUP BY 1, 2
+        '''
+    cursor.execute(f'''
+        INSERT INTO {target} (app_name, bucket, success_count, failure_count)
+        {select}
+        ON CONFLICT (app_name, bucket) DO UPDATE SET
+            success_count = {target}.success_count + EXCLUDED.success_count,
+            failure_count = {target}.failure_count + EXCLUDED.failure_count
+    ''', (since, upto))
+    cursor.execute('''
+        INSERT INTO health_history_rollups (name, watermark) VALUES (%s, %s)
+        ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark
+    ''', (name, upto))
+
+
+def run_health_history_maintenance():
+    """Create upcoming partitions, roll raw results up to minutes and hours, and drop expired partitions."""
+    with _get_db_pool('master').connection() as connection:
         cursor = connection.cursor()
+        start_time = time.perf_counter()
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (_HEALTH_HISTORY_LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            return
+        now = datetime.datetime.utcnow()
+        settled = now - datetime.timedelta(seconds=HEALTH_HISTORY_ROLLUP_DELAY_SECONDS)
+        _create_health_history_partitions(cursor, now)
+        _rollup_health_history(cursor, "1m", "health_history_raw", "health_history_1m", "minute",
+                               settled.replace(second=0, microsecond=0))
+        _rollup_health_history(cursor, "1h", "health_history_1m", "health_history_1h", "hour",
+                               settled.replace(minute=0, second=0, microsecond=0))
+        _drop_expired_health_history_partitions(cursor, now)
+        connection.commit()
+        process_time = time.perf_counter() - start_time
+        DB_RESPONSE_TIME.labels(path='rollup').observe(process_time)
+
+
+def _run_health_history_maintenance_loop():
+    while True:
+        time.sleep(HEALTH_HISTORY_ROLLUP_SECONDS)
+        try:
+            run_health_history_maintenance()
+        except Exception as e:
+            DB_ERROR_COUNT.labels(path='rollup').inc()
+            logger.error(f"health history: maintenance failed because {e}")
+
+
+# Set once _bootstrap_health_status_table has created every table
+_tables_ready = threading.Event()
+
+
+def _bootstrap_health_status_table():
+    """Create the health and operation tables once at startup, retrying until the master is reachable."""
+    backoff = 1
+    while not (create_health_status_table() and create_health_history_tables() and create_operations_table()):
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+    logger.info("startup: health tables are ready")
+    _tables_ready.set()
+    _run_health_history_maintenance_loop()
+
+
+def _upsert_health_status(rows, history=()):
+    """Add (app_name, failure_count, success_count, last_failure, last_success) rows in one statement.
 
-        # SQL to create the health_status table
+    ``history`` holds (app_name, ts, healthy) results that are appended to health_history_raw
+    in the same transaction.
+    """
+    with _get_db_pool('master').connection() as connection:
+        cursor = connection.cursor()
         start_time = time.perf_counter()
-        create_table_query = '''
-        CREATE TABLE IF NOT EXISTS health_status (
-            app_name VARCHAR(255) PRIMARY KEY,
-            failure_count INT NOT NULL,
-            success_count INT NOT NULL,
-            last_failure TIMESTAMP,
-            last_success TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        '''
-        cursor.execute(create_table_query)
+        execute_values(cursor, '''
+            INSERT INTO health_status (app_name, failure_count, success_count, last_failure, last_success)
+            VALUES %s
+            ON CONFLICT (app_name) DO UPDATE SET
+                failure_count = health_status.failure_count + EXCLUDED.failure_count,
+                success_count = health_status.success_count + EXCLUDED.success_count,
+                last_failure = COALESCE(EXCLUDED.last_failure, health_status.last_failure),
+                last_success = COALESCE(EXCLUDED.last_success, health_status.last_success)
+        ''', rows)
+        if history:
+            execute_values(cursor, "INSERT INTO health_history_raw (app_name, ts, healthy) VALUES %s", history,
+                           page_size=1000)
         connection.commit()
-        process_time = (time.perf_counter() - start_time) * 1000
-        DB_RESPONSE_TIME.labels(path='create table').set(process_time)
+        process_time = time.perf_counter() - start_time
+        DB_RESPONSE_TIME.labels(path='upsert').observe(process_time)
+
+
+class _HealthReportBuffer:
+    """Aggregates health results per app in memory and writes them to the master in batches.
+
+    A background thread flushes every ``HEALTH_REPORT_FLUSH_SECONDS`` with one multi-row
+    upsert; rows that fail to be written are merged back and retried on the next flush.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._history = []
+        self._oldest = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, app_name, healthy, timestamp=None):
+        timestamp = timestamp or datetime.datetime.utcnow()
+        with self._lock:
+            self._merge(app_name, 0 if healthy else 1, 1 if healthy else 0,
+                        None if healthy else timestamp, timestamp if healthy else None)
+            self._history.append((app_name, timestamp, healthy))
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            HEALTH_REPORT_BUFFER_DEPTH.set(len(self._rows))
+        HEALTH_REPORT_COUNT.inc()
+
+    def _merge(self, app_name, failures, successes, last_failure, last_success):
+        _, old_failures, old_successes, old_last_failure, old_last_success = self._rows.get(
+            app_name, (app_name, 0, 0, None, None))
+        self._rows[app_name] = (
+            app_name,
+            old_failures + failures,
+            old_successes + successes,
+            max(filter(None, (old_last_failure, last_failure)), default=None),
+            max(filter(None, (old_last_success, last_success)), default=None)
+        )
 
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, {}
+            history, self._history = self._history, []
+            oldest, self._oldest = self._oldest, None
+            HEALTH_REPORT_BUFFER_DEPTH.set(0)
+        if not rows:
+            return
+        try:
+            _upsert_health_status(list(rows.values()), history)
+            HEALTH_REPORT_FLUSH_LAG.set(time.monotonic() - oldest)
+        except Exception as e:
+            DB_ERROR_COUNT.labels(path='upsert').inc()
+            logger.error(f"health reports: failed to write {len(rows)} rows because {e}")
+            with self._lock:
+                for row in rows.values():
+                    self._merge(*row)
+                # Keep the newest raw results only, so a long outage cannot grow the buffer forever.
+                self._history = (history + self._history)[-HEALTH_HISTORY_MAX_BUFFERED:]
+                self._oldest = min(filter(None, (oldest, self._oldest)))
+                HEALTH_REPORT_BUFFER_DEPTH.set(len(self._rows))
+
+    def _run(self):
+        while not self._stop.wait(HEALTH_REPORT_FLUSH_SECONDS):
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-report-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still buffered."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+_health_reports = _HealthReportBuffer()
+
+
+def api_add_health_reports(reports):
+    for report in reports:
+        timestamp = report.Timestamp
+        if timestamp is not None and timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        _health_reports.add(report.AppName, report.Healthy, timestamp)
+
+
+class _HealthProber:
+    """Probes the /healthz of every monitored app concurrently and writes the results in batches.
+
+    Apps are discovered from the deployments informer through the ``kaas/monitor*`` annotations.
+    Each app is probed on its own interval with jitter, over one shared keep-alive HTTP client,
+    and results go to the shared health report buffer.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._targets = {}
+        self._http = None
+        self._probes = None
+
+    async def run(self):
+        self._probes = asyncio.Semaphore(PROBER_MAX_CONCURRENCY)
+        limits = httpx.Limits(max_connections=PROBER_MAX_CONCURRENCY, max_keepalive_connections=PROBER_MAX_CONCURRENCY)
+        async with httpx.AsyncClient(limits=limits) as http:
+            self._http = http
+            try:
+                while True:
+                    try:
+                        await self._discover()
+                    except Exception as e:
+                        logger.error(f"prober: discovery failed because {e}")
+                    await asyncio.sleep(PROBER_DISCOVERY_SECONDS)
+            finally:
+                for _, task in self._targets.values():
+                    task.cancel()
+
+    async def _discover(self):
+        loop = asyncio.get_running_loop()
+        informer = await loop.run_in_executor(None, _get_informer, "deployments", self.namespace)
+        targets = {}
+        for deployment in informer.list():
+            annotations = deployment.metadata.annotations or {}
+            if annotations.get(MONITOR_ANNOTATION) != "true":
+                continue
+            try:
+                targets[deployment.metadata.name] = (
+                    int(annotations[MONITOR_PORT_ANNOTATION]),
+                    float(annotations.get(MONITOR_INTERVAL_ANNOTATION, PROBER_DEFAULT_INTERVAL_SECONDS)),
+                    float(annotations.get(MONITOR_TIMEOUT_ANNOTATION, PROBER_DEFAULT_TIMEOUT_SECONDS))
+                )
+            except (KeyError, ValueError) as e:
+                logger.error(f"prober: bad monitor annotations on {deployment.metadata.name}: {e}")
+
+        for app_name in list(self._targets):
+            if targets.get(app_name) != self._targets[app_name][0]:
+                self._targets.pop(app_name)[1].cancel()
+        for app_name, target in targets.items():
+            if app_name not in self._targets:
+                self._targets[app_name] = (target, asyncio.ensure_future(self._probe_loop(app_name, *target)))
+        PROBER_TARGETS.set(len(self._targets))
+
+    async def _probe_loop(self, app_name, port, interval, timeout):
+        url = f"http://{app_name}.{self.namespace}.svc.cluster.local:{port}/healthz"
+        # Spread the first probes over one interval so that restarts don't probe everything at once.
+        await asyncio.sleep(random.uniform(0, interval))
+        while True:
+            await self._probe(app_name, url, timeout)
+            await asyncio.sleep(interval * random.uniform(1 - PROBER_JITTER, 1 + PROBER_JITTER))
+
+    async def _probe(self, app_name, url, timeout):
+        async with self._probes:
+            start_time = time.perf_counter()
+            try:
+                response = await self._http.get(url, timeout=timeout)
+                healthy = response.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            PROBE_RESPONSE_TIME.observe(time.perf_counter() - start_time)
+        PROBE_COUNT.labels(result="success" if healthy else "failure").inc()
+        _health_reports.add(app_name, healthy)
+
+
+@app.post("/applications", status_code=202)
+def add_new_application(app_data: AppData, response: Response):
+    try:
+        operation_id = api_enqueue_operation("application", app_data)
+        response.headers["Location"] = f"/operations/{operation_id}"
+        return {"status": "Application creation queued", "operation_id": operation_id}
+    except ApiException as e:
+        if e.status == 409:
+            raise HTTPException(status_code=409, detail=f"Secret {app_data.AppName}-secret already exists")
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        DB_ERROR_COUNT.labels(path='create table').inc()
-        print(f"Error creating table: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        if connection:
-            connection.close()
 
+@app.put("/applications")
+async def apply_application(app_data: AppData):
+    try:
+        objects = await api_add_new_application(app_data, apply=True)
+        return {"status": "Application applied successfully", "objects": objects}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/applications/batch")
+async def add_new_applications_batch(request: Request):
+    async def lines():
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            for line in complete:
+                yield line
+        yield buffer
+
+    try:
+        valid, rejected = await _read_app_data_batch(lines())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def results():
+        for result in rejected:
+            yield json.dumps(result) + "\n"
+        async for result in api_add_new_applications_batch(valid):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
-@app.post("/applications")
-def add_new_application(app_data: AppData):
+
+@app.get("/deployments/{namespace}/events")
+async def deployment_events(request: Request, namespace: str,
+                            resource_version: Optional[str] = Query(None, alias="resourceVersion")):
+    if _event_subscribers >= SSE_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=429, detail="Too many event stream clients",
+                            headers={"Retry-After": str(READ_RETRY_AFTER_SECONDS)})
     try:
-        api_add_new_application(app_data)
-        return {"status": "Application created successfully"}
+        events = await api_deployment_events(namespace, request.headers.get("last-event-id") or resource_version)
+        return StreamingResponse(events, media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    except ApiException as e:
+        if e.status in (403, 404):
+            raise HTTPException(status_code=e.status, detail=f"Cannot read namespace {namespace}: {e.reason}")
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        FAILED_REQUEST_COUNT.labels(path='/applications').inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/deployments/{namespace}/{app_name}")
 @app.get("/deployments/{namespace}")
-def get_deployment_status(namespace: str, app_name: Optional[str] = ''):
+def get_deployment_status(request: Request, namespace: str, app_name: Optional[str] = '',
+                          limit: Optional[int] = Query(None, ge=1),
+                          continue_token: Optional[str] = Query(None, alias="continue"),
+                          stream: bool = False, view: Literal["full", "summary"] = "full",
+                          phase: Optional[List[PodPhase]] = Query(None)):
+    phases = frozenset(phase or ())
+    path, client_id = request.state.route, _client_id(request)
+
+    def admitted(func):
+        def call():
+            with _admitted(path, client_id):
+                return func()
+        return call
+
     try:
-        return api_get_deployment_status(namespace, app_name)
+        headers = {}
+        staleness = api_cache_staleness(namespace)
+        if staleness is not None:
+            headers["X-Cache-Staleness-Seconds"] = f"{staleness:.3f}"
+
+        if not app_name and stream:
+            # The slot is held until the stream ends, not just while it is set up.
+            _admit(path, client_id)
+            try:
+                body = api_stream_deployment_status(namespace, view, phases)
+            except BaseException:
+                _admission.release(client_id)
+                raise
+            return StreamingResponse(_AdmittedStream(body, client_id), media_type="application/x-ndjson",
+                                     headers=headers)
+        # Identical concurrent reads share one computation; the result is not modified afterwards.
+        # Only the request that computes it takes an admission slot.
+        if not app_name and limit:
+            # Pages are read from the API server, not the cache, so there is no ETag for them.
+            status = _deployment_reads.do(
+                ("page", namespace, limit, continue_token, view, phases),
+                admitted(lambda: api_get_deployment_status_page(namespace, limit, continue_token, view, phases)))
+            return _FastJSONResponse(status, headers=headers)
+        # The ETag is part of the key, so that a read never shares a body built before the change its ETag names.
+        etag = api_deployment_status_etag(namespace, app_name, view, phases)
+        return _conditional_response(
+            request, etag,
+            lambda: _deployment_reads.do(("status", namespace, app_name, view, phases, etag),
+                                         admitted(lambda: api_get_deployment_status(namespace, app_name, view,
+                                                                                    phases))),
+            headers)
+    except _AdmissionRejected:
+        raise
+    except ApiException as e:
+        if e.status == 410:
+            raise HTTPException(status_code=410, detail="The continue token has expired, restart the listing")
+        if e.status in (403, 404):
+            raise HTTPException(status_code=e.status, detail=f"Cannot read namespace {namespace}: {e.reason}")
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        FAILED_REQUEST_COUNT.labels(path='/deployments').inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/postgres")
-def create_postgres_service(app_data: PostgresAppData):
+@app.post("/postgres", status_code=202)
+def create_postgres_service(app_data: PostgresAppData, response: Response):
     try:
-        api_create_postgres_service(app_data)
-        return {"status": "Postgres service created successfully"}
+        operation_id = api_enqueue_operation("postgres", app_data)
+        response.headers["Location"] = f"/operations/{operation_id}"
+        return {"status": "Postgres service creation queued", "operation_id": operation_id}
     except Exception as e:
         logger.info("self-service: failed because" + str(e))
-        FAILED_REQUEST_COUNT.labels(path='/postgres').inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.put("/postgres")
+async def apply_postgres_service(app_data: PostgresAppData):
+    try:
+        objects = await api_create_postgres_service(app_data, apply=True)
+        return {"status": "Postgres service applied successfully", "objects": objects}
+    except Exception as e:
+        logger.info("self-service: failed because" + str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/operations/{operation_id}")
+def get_operation(operation_id: str):
+    try:
+        operation = api_get_operation(operation_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if operation is None:
+        raise HTTPException(status_code=404, detail=f"Operation {operation_id} not found")
+    return operation
+
+
 @app.post("/ping")
 def ping():
     try:
         return {"status": "pong"}
     except Exception as e:
-        FAILED_REQUEST_COUNT.labels(path='/ping').inc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _health_bulk(app_names):
+    app_names = list(dict.fromkeys(name for name in app_names if name))
+    if not app_names:
+        raise HTTPException(status_code=400, detail="no application names given")
+    if len(app_names) > HEALTH_BULK_MAX_APPS:
+        raise HTTPException(status_code=400, detail=f"at most {HEALTH_BULK_MAX_APPS} applications per request")
+    try:
+        return api_health_bulk(app_names)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/health")
+def health_bulk(apps: str):
+    return _health_bulk(apps.split(","))
+
+
+@app.post("/health")
+def health_bulk_post(apps: List[str]):
+    return _health_bulk(apps)
+
+
+@app.get("/health/{app_name}/history")
+def health_history(app_name: str, start: Optional[datetime.datetime] = Query(None, alias="from"),
+                   end: Optional[datetime.datetime] = Query(None, alias="to"), step: str = "5m"):
+    try:
+        step_seconds = _parse_step(step)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"invalid step: {e}")
+    if end is not None and end.tzinfo is not None:
+        end = end.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    if start is not None and start.tzinfo is not None:
+        start = start.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    end = end or datetime.datetime.utcnow()
+    start = start or end - datetime.timedelta(hours=6)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    try:
+        return api_health_history(app_name, start, end, step_seconds)
+    except Exception as e:
+        DB_ERROR_COUNT.labels(path='history').inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/health/{app_name}")
-def health(app_name: str):
+def health(request: Request, app_name: str):
     try:
-        return api_health(app_name)
+        return _conditional_response(request, api_health_etag(app_name), lambda: api_health(app_name))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/health/reports", status_code=202)
+def add_health_reports(reports: Union[HealthReport, List[HealthReport]]):
+    try:
+        if isinstance(reports, HealthReport):
+            reports = [reports]
+        api_add_health_reports(reports)
+        return {"status": "accepted", "count": len(reports)}
     except Exception as e:
-        FAILED_REQUEST_COUNT.labels(path='/health/').inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -554,36 +3548,53 @@ def liveness():
 
 @app.get("/ready")
 def readiness():
-    namespace = "default"
-    app_name = "kaas-api"
-    try:
-        apps_api = client.AppsV1Api()
-        deployment = apps_api.read_namespaced_deployment(name=app_name, namespace=namespace)
-        logger.info("readiness: deployment status created in readiness")
-        # Check if the deployment has at least one ready replica
-        if deployment.spec.replicas is None or deployment.spec.replicas < 1:
-            logger.error("readiness: there is no replica created")
-            raise HTTPException(status_code=500, detail="Application is not ready yet")
-        logger.info("readiness: done")
-        return {"status": "ok"}
-    except Exception as e:
-        logger.info(str(e))
-        raise HTTPException(status_code=500, detail=str(e))
+    # Only reads the dependency monitor's cached results; no calls are made from the probe.
+    dependencies = _dependency_monitor.snapshot()
+    failing = [name for name in READINESS_DEPENDENCIES if not dependencies.get(name, {}).get("healthy")]
+    if failing:
+        logger.error(f"readiness: failing dependencies {failing}")
+        raise HTTPException(status_code=500, detail={"status": "not ready", "dependencies": dependencies})
+    return {"status": "ok", "dependencies": dependencies}
 
 
 @app.get("/startup")
 def startup():
+    if not _dependency_monitor.started():
+        logger.info("startup: the API server has not been reached yet")
+        raise HTTPException(status_code=500, detail="the API server has not been reached yet")
+    logger.info("startup: done")
+    return {"status": "ok"}
+
+
+async def _run_standalone_prober():
+    """Entry point of ``python main.py prober``; flushes buffered results when stopped by SIGTERM."""
+    prober = asyncio.ensure_future(_HealthProber(PROBER_NAMESPACE).run())
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, prober.cancel)
+    _health_reports.start()
     try:
-        api_instance = client.CoreV1Api()
-        api_instance.get_api_resources()
-        logger.info("startup: done")
-        return {"status": "ok"}
-    except Exception as e:
-        logger.info("startup: failed because" + str(e))
-        raise HTTPException(status_code=500, detail=str(e))
+        await prober
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, _health_reports.stop)
 
 
-if __name__ == "__main__":
-    import uvicorn
+def _serve():
+    """Run the API with ``KAAS_WORKERS`` uvicorn workers."""
+    if KAAS_WORKERS > 1 and not PROMETHEUS_MULTIPROC_DIR:
+        # Workers are new interpreters, so they pick this up before importing prometheus_client.
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = "/tmp/kaas-api-metrics"
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir)
+    # Hand the process over to uvicorn, so that worker processes import this module only once, as main.
+    os.execv(sys.executable, [sys.executable, "-m", "uvicorn", "main:app", "--host", "0.0.0.0", "--port", "8000",
+                              "--workers", str(KAAS_WORKERS)])
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["prober"]:
+        asyncio.run(_run_standalone_prober())
+    else:
+        _serve()
@@ -0,0 +1,32 @@
+"""Runs the tests against the in-process fake Kubernetes API server of the benchmark harness.
+
+``main`` loads its Kubernetes config at import time, so KUBECONFIG points at the fake server before it is imported.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmark"))
+
+import fake_kube  # noqa: E402
+import run  # noqa: E402
+
+_kube = fake_kube.FakeKubernetes()
+_server = fake_kube.serve(_kube)
+os.environ["KUBECONFIG"] = run._write_kubeconfig(tempfile.mkdtemp(prefix="kaas-test-"), _server.server_port)
+
+
+@pytest.fixture
+def kube():
+    return _kube
+
+
+@pytest.fixture
+def namespace():
+    """A namespace of its own for each test; informer caches are per namespace and outlive a test."""
+    return f"test-{uuid.uuid4().hex[:8]}"
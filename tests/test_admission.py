@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def slow_deployment_status(monkeypatch):
+    """Deployment reads that take long enough to overlap, counting the computations."""
+    calls = []
+
+    def get_deployment_status(namespace, app_name, view="full", phases=None):
+        calls.append(namespace)
+        time.sleep(0.5)
+        return []
+
+    monkeypatch.setattr(main, "api_get_deployment_status", get_deployment_status)
+    monkeypatch.setattr(main, "api_deployment_status_etag", lambda *args: None)
+    monkeypatch.setattr(main, "api_cache_staleness", lambda namespace: None)
+    return calls
+
+
+def _get_concurrently(paths):
+    client = TestClient(main.app)
+    responses = [None] * len(paths)
+
+    def get(i):
+        responses[i] = client.get(paths[i])
+
+    threads = [threading.Thread(target=get, args=(i,)) for i in range(len(paths))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def test_identical_reads_take_one_admission_slot(monkeypatch, slow_deployment_status):
+    monkeypatch.setattr(main, "_admission", main._AdmissionController(64, 2))
+    responses = _get_concurrently(["/deployments/default"] * 30)
+    assert [response.status_code for response in responses] == [200] * 30
+    assert len(slow_deployment_status) < 30
+
+
+def test_distinct_reads_over_the_client_limit_are_rejected(monkeypatch, slow_deployment_status):
+    monkeypatch.setattr(main, "_admission", main._AdmissionController(64, 1))
+    responses = _get_concurrently(["/deployments/default/a", "/deployments/default/b"])
+    assert sorted(response.status_code for response in responses) == [200, 429]
+    rejected = next(response for response in responses if response.status_code == 429)
+    assert rejected.headers["Retry-After"] == str(main.READ_RETRY_AFTER_SECONDS)
+
+
+def test_stream_holds_its_slot_until_it_ends(monkeypatch, slow_deployment_status):
+    monkeypatch.setattr(main, "_admission", main._AdmissionController(64, 1))
+    streaming, finish = threading.Event(), threading.Event()
+
+    def stream_deployment_status(namespace, view="full", phases=None):
+        yield b'{"DeploymentName": "a"}\n'
+        streaming.set()
+        finish.wait(5)
+        yield b'{"DeploymentName": "b"}\n'
+
+    monkeypatch.setattr(main, "api_stream_deployment_status", stream_deployment_status)
+    client = TestClient(main.app)
+    responses = []
+    stream = threading.Thread(target=lambda: responses.append(client.get("/deployments/default?stream=true")))
+    stream.start()
+    try:
+        assert streaming.wait(5)
+        assert client.get("/deployments/default/a").status_code == 429
+    finally:
+        finish.set()
+        stream.join()
+    assert responses[0].status_code == 200
+    assert len(responses[0].text.splitlines()) == 2
+    assert client.get("/deployments/default/a").status_code == 200
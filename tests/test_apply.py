@@ -0,0 +1,89 @@
+import pytest
+from kubernetes import client
+from kubernetes.client import ApiException
+
+import main
+
+
+def _configmap(name, data):
+    return client.V1ConfigMap(metadata=client.V1ObjectMeta(name=name), data=data)
+
+
+def _secret(name, data):
+    return client.V1Secret(metadata=client.V1ObjectMeta(name=name), string_data=data)
+
+
+@pytest.fixture
+def core_api():
+    return client.CoreV1Api(main.api_client)
+
+
+def test_is_subset_ignores_server_filled_fields():
+    desired = {"metadata": {"name": "a"}, "data": {"k": "v"}}
+    live = {"metadata": {"name": "a", "uid": "1", "resourceVersion": "7"}, "data": {"k": "v"}, "status": {}}
+    assert main._is_subset(desired, live)
+
+
+def test_is_subset_detects_changed_and_missing_values():
+    assert not main._is_subset({"data": {"k": "v"}}, {"data": {"k": "w"}})
+    assert not main._is_subset({"data": {"k": "v"}}, {"data": {}})
+    assert not main._is_subset({"items": [1, 2]}, {"items": [1]})
+
+
+def test_is_subset_matches_empty_desired_with_missing_live():
+    assert main._is_subset({"labels": {}, "items": []}, {})
+
+
+def test_apply_creates_missing_object(core_api, kube, namespace):
+    assert main._apply_object(core_api, "config_map", namespace, _configmap("cm", {"k": "v"})) == "created"
+    assert kube.get("configmaps", namespace, "cm")[1]["data"] == {"k": "v"}
+
+
+def test_apply_leaves_identical_object_unchanged(core_api, kube, namespace):
+    main._apply_object(core_api, "config_map", namespace, _configmap("cm", {"k": "v"}))
+    version = kube.get("configmaps", namespace, "cm")[1]["metadata"]["resourceVersion"]
+
+    assert main._apply_object(core_api, "config_map", namespace, _configmap("cm", {"k": "v"})) == "unchanged"
+    assert kube.get("configmaps", namespace, "cm")[1]["metadata"]["resourceVersion"] == version
+
+
+def test_apply_patches_changed_object(core_api, kube, namespace):
+    main._apply_object(core_api, "config_map", namespace, _configmap("cm", {"k": "v"}))
+
+    assert main._apply_object(core_api, "config_map", namespace, _configmap("cm", {"k": "w"})) == "patched"
+    assert kube.get("configmaps", namespace, "cm")[1]["data"] == {"k": "w"}
+
+
+def test_apply_compares_secret_string_data_with_encoded_data(core_api, kube, namespace):
+    assert main._apply_object(core_api, "secret", namespace, _secret("s", {"TOKEN": "a"})) == "created"
+    assert main._apply_object(core_api, "secret", namespace, _secret("s", {"TOKEN": "a"})) == "unchanged"
+    assert main._apply_object(core_api, "secret", namespace, _secret("s", {"TOKEN": "b"})) == "patched"
+    assert kube.get("secrets", namespace, "s")[1]["data"] == {"TOKEN": "Yg=="}
+
+
+def test_apply_creates_again_when_conflicting_object_is_gone(core_api, kube, namespace, monkeypatch):
+    create = core_api.create_namespaced_config_map
+    calls = []
+
+    def create_after_conflict(namespace, body, **kwargs):
+        # The first create races with an object that is deleted again before it can be read.
+        calls.append(body)
+        if len(calls) == 1:
+            raise ApiException(status=409, reason="AlreadyExists")
+        return create(namespace, body, **kwargs)
+
+    monkeypatch.setattr(core_api, "create_namespaced_config_map", create_after_conflict)
+
+    assert main._apply_object(core_api, "config_map", namespace, _configmap("cm", {"k": "v"})) == "created"
+    assert len(calls) == 2
+    assert kube.get("configmaps", namespace, "cm")[0] == 200
+
+
+def test_apply_gives_up_when_object_keeps_disappearing(core_api, namespace, monkeypatch):
+    def always_conflicts(namespace, body, **kwargs):
+        raise ApiException(status=409, reason="AlreadyExists")
+
+    monkeypatch.setattr(core_api, "create_namespaced_config_map", always_conflicts)
+
+    with pytest.raises(RuntimeError, match="created and deleted concurrently"):
+        main._apply_object(core_api, "config_map", namespace, _configmap("cm", {"k": "v"}))
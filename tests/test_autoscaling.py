@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+import main
+
+
+def _app_data(**autoscaling):
+    return {
+        "AppName": "web",
+        "Monitor": "false",
+        "ImageAddress": "nginx",
+        "ImageTag": "latest",
+        "ServicePort": 80,
+        "Resources": {"CPU": "100m", "RAM": "128Mi"},
+        "Envs": [],
+        "Autoscaling": autoscaling
+    }
+
+
+def test_valid_spec_is_accepted():
+    spec = main.AutoscalingSpec(MinReplicas=2, MaxReplicas=5, TargetMemoryUtilization=75)
+
+    assert spec.TargetCPUUtilization == 80
+
+
+def test_min_above_max_is_rejected():
+    with pytest.raises(ValidationError, match="MinReplicas 5 is above MaxReplicas 2"):
+        main.AutoscalingSpec(MinReplicas=5, MaxReplicas=2)
+
+
+def test_spec_without_targets_is_rejected():
+    with pytest.raises(ValidationError, match="utilization target"):
+        main.AutoscalingSpec(MaxReplicas=3, TargetCPUUtilization=None)
+
+
+@pytest.mark.parametrize("method", ["post", "put"])
+def test_invalid_spec_is_rejected_before_provisioning(method):
+    # Without the lifespan, nothing is queued or provisioned; the request must fail validation first.
+    response = getattr(TestClient(main.app), method)("/applications", json=_app_data(MinReplicas=5, MaxReplicas=2))
+
+    assert response.status_code == 422
+
+
+def test_batch_rejects_invalid_spec_up_front():
+    async def lines():
+        yield json.dumps(_app_data(MaxReplicas=3)).encode()
+        yield json.dumps(dict(_app_data(MinReplicas=5, MaxReplicas=2), AppName="bad")).encode()
+
+    valid, rejected = asyncio.run(main._read_app_data_batch(lines()))
+
+    assert [app_data.AppName for _, app_data in valid] == ["web"]
+    assert len(rejected) == 1
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+import main
+
+DB_CONFIG = {'DB_HOST': 'master', 'DB_HOST_SLAVE': 'slave', 'DB_PORT': 5432, 'DB_NAME': 'kaas',
+             'DB_USER': 'kaas', 'DB_PASSWORD': 'secret'}
+
+
+class _Connection:
+    closed = 0
+
+    def rollback(self):
+        pass
+
+
+class _FakePool:
+    """Stands in for ThreadedConnectionPool; ``connecting`` can hold up the first connection of a host."""
+    connecting = {}
+    instances = []
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.kwargs = kwargs
+        self.closed = False
+        if kwargs['host'] in _FakePool.connecting:
+            _FakePool.connecting[kwargs['host']].wait(5)
+        _FakePool.instances.append(self)
+
+    def getconn(self):
+        assert not self.closed
+        return _Connection()
+
+    def putconn(self, connection, close=False):
+        pass
+
+    def closeall(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_pools(monkeypatch):
+    _FakePool.connecting, _FakePool.instances = {}, []
+    monkeypatch.setattr(main, "ThreadedConnectionPool", _FakePool)
+    monkeypatch.setattr(main, "_db_pools", {})
+    config = dict(DB_CONFIG)
+    monkeypatch.setattr(main, "_get_db_config", lambda namespace='default': dict(config))
+    return config
+
+
+def test_pool_connects_with_a_timeout(fake_pools):
+    main._get_db_pool('master')
+    assert _FakePool.instances[0].kwargs['connect_timeout'] >= 1
+
+
+def test_changed_config_closes_the_old_pool_once_its_connections_are_returned(fake_pools):
+    old = main._get_db_pool('master')
+    with old.connection():
+        fake_pools['DB_PASSWORD'] = 'rotated'
+        new = main._get_db_pool('master')
+        assert new is not old
+        assert not _FakePool.instances[0].closed
+    assert _FakePool.instances[0].closed
+    assert not _FakePool.instances[1].closed
+
+
+def test_idle_old_pool_is_closed_right_away(fake_pools):
+    main._get_db_pool('master')
+    fake_pools['DB_PASSWORD'] = 'rotated'
+    main._get_db_pool('master')
+    assert _FakePool.instances[0].closed
+
+
+def test_slow_host_does_not_hold_up_the_other_role(fake_pools):
+    connected = _FakePool.connecting['master'] = threading.Event()
+    thread = threading.Thread(target=main._get_db_pool, args=('master',))
+    thread.start()
+    try:
+        assert main._get_db_pool('slave').name == 'slave'
+    finally:
+        connected.set()
+        thread.join()
@@ -0,0 +1,36 @@
+import threading
+import time
+
+import main
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_hanging_check_times_out_without_holding_up_the_others(monkeypatch):
+    monkeypatch.setattr(main, "DEPENDENCY_CHECK_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(main, "DEPENDENCY_CHECK_INTERVAL_SECONDS", 0.05)
+    released = threading.Event()
+    calls = []
+
+    def hanging():
+        calls.append("hanging")
+        released.wait(10)
+
+    monitor = main._DependencyMonitor({"api_server": lambda: None, "master": hanging})
+    monitor.start()
+    try:
+        _wait_for(lambda: monitor.snapshot()["master"]["consecutive_failures"] >= 3)
+        snapshot = monitor.snapshot()
+        assert snapshot["api_server"]["healthy"]
+        assert not snapshot["master"]["healthy"]
+        assert "did not finish" in snapshot["master"]["error"]
+        # A hung check is not started again while it still runs.
+        assert calls == ["hanging"]
+    finally:
+        released.set()
+    _wait_for(lambda: monitor.snapshot()["master"]["healthy"])
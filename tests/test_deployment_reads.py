@@ -0,0 +1,34 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_read_after_a_change_does_not_share_an_older_body(monkeypatch):
+    version = {"current": "v1"}
+    building = threading.Event()
+
+    def get_deployment_status(namespace, app_name, view="full", phases=None):
+        seen = version["current"]
+        building.set()
+        time.sleep(0.5)
+        return [{"version": seen}]
+
+    monkeypatch.setattr(main, "api_get_deployment_status", get_deployment_status)
+    monkeypatch.setattr(main, "api_deployment_status_etag", lambda *args: f'"{version["current"]}"')
+    monkeypatch.setattr(main, "api_cache_staleness", lambda namespace: None)
+    client = TestClient(main.app)
+    responses = {}
+    leader = threading.Thread(target=lambda: responses.update(leader=client.get("/deployments/default")))
+    leader.start()
+    building.wait(5)
+    version["current"] = "v2"
+    follower = client.get("/deployments/default")
+    leader.join()
+
+    assert responses["leader"].headers["ETag"] == '"v1"'
+    assert responses["leader"].json() == [{"version": "v1"}]
+    assert follower.headers["ETag"] == '"v2"'
+    assert follower.json() == [{"version": "v2"}]
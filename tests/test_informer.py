@@ -0,0 +1,76 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from kubernetes import client
+from kubernetes.client import ApiException
+
+import main
+
+
+@pytest.fixture
+def informers(monkeypatch):
+    """An empty informer registry of its own, stopped at the end of the test."""
+    monkeypatch.setattr(main, "_informers", {})
+    monkeypatch.setattr(main, "_informer_namespaces", main.collections.OrderedDict())
+    monkeypatch.setattr(main, "INFORMER_WATCH_TIMEOUT_SECONDS", 1)
+    yield main._informers
+    for informer in main._informers.values():
+        informer.stop()
+
+
+def _refused(status):
+    def list_func(*args, **kwargs):
+        raise ApiException(status=status, reason="Forbidden")
+    return list_func
+
+
+def test_refused_first_list_fails_fast():
+    informer = main._Informer("configmaps", _refused(403), "forbidden")
+    start = time.monotonic()
+    with pytest.raises(ApiException) as e:
+        informer.wait_for_sync(timeout=5)
+    assert e.value.status == 403
+    assert time.monotonic() - start < 2
+    informer._thread.join(1)
+    assert not informer._thread.is_alive()
+
+
+def test_least_recently_used_namespaces_are_evicted(monkeypatch, informers, namespace):
+    monkeypatch.setattr(main, "INFORMER_MAX_NAMESPACES", 2)
+    first = main._get_informer("configmaps", f"{namespace}-1")
+    main._get_informer("configmaps", f"{namespace}-2")
+    main._get_informer("configmaps", f"{namespace}-1")
+    main._get_informer("configmaps", f"{namespace}-3")
+    assert sorted(key[1] for key in informers) == [f"{namespace}-1", f"{namespace}-3"]
+    assert informers[("configmaps", f"{namespace}-1")] is first
+
+
+def test_evicted_informer_thread_exits(monkeypatch, informers, namespace):
+    monkeypatch.setattr(main, "INFORMER_MAX_NAMESPACES", 1)
+    evicted = main._get_informer("configmaps", f"{namespace}-1")
+    main._get_informer("configmaps", f"{namespace}-2")
+    evicted._thread.join(5)
+    assert not evicted._thread.is_alive()
+
+
+def test_namespaces_with_subscribers_are_kept(monkeypatch, informers, namespace):
+    monkeypatch.setattr(main, "INFORMER_MAX_NAMESPACES", 1)
+    main._get_informer("configmaps", f"{namespace}-1").subscribe(lambda *args: None)
+    main._get_informer("configmaps", f"{namespace}-2")
+    assert ("configmaps", f"{namespace}-1") in informers
+
+
+def test_deployment_read_of_forbidden_namespace_returns_403(monkeypatch, informers, namespace):
+    monkeypatch.setattr(client.AppsV1Api, "list_namespaced_deployment", _refused(403))
+    start = time.monotonic()
+    response = TestClient(main.app).get(f"/deployments/{namespace}")
+    assert response.status_code == 403
+    assert time.monotonic() - start < main.INFORMER_SYNC_TIMEOUT_SECONDS
+
+
+def test_informers_watch_on_their_own_connection_pool(informers, namespace):
+    informer = main._get_informer("configmaps", namespace)
+    assert informer._list_func.__self__.api_client is main.watch_api_client
+    assert main.watch_api_client.rest_client.pool_manager.connection_pool_kw["maxsize"] >= \
+        4 * main.INFORMER_MAX_NAMESPACES
@@ -0,0 +1,45 @@
+import uuid
+
+import pytest
+from kubernetes.client import ApiException
+
+import main
+
+
+def _app_data(name):
+    return main.AppData(AppName=name, Monitor="false", ImageAddress="nginx", ImageTag="1", ServicePort=80,
+                        Resources={}, Envs=[main.EnvVar(Key="TOKEN", Value="hunter2", IsSecret=True),
+                                            main.EnvVar(Key="MODE", Value="fast", IsSecret=False)])
+
+
+def test_queued_application_payload_has_no_secret_values(kube):
+    name = f"app-{uuid.uuid4().hex[:8]}"
+    payload = main._queue_application(_app_data(name))
+    assert payload["Envs"] == [{"Key": "TOKEN", "Value": "", "IsSecret": True},
+                               {"Key": "MODE", "Value": "fast", "IsSecret": False}]
+    assert kube.get("secrets", "default", f"{name}-secret")[1]["data"] == {"TOKEN": "aHVudGVyMg=="}
+
+
+def test_discarding_queued_application_deletes_its_secret(kube):
+    name = f"app-{uuid.uuid4().hex[:8]}"
+    app_data = _app_data(name)
+    main._queue_application(app_data)
+    main._discard_queued_application(app_data)
+    main._discard_queued_application(app_data)
+    assert kube.get("secrets", "default", f"{name}-secret")[0] == 404
+
+
+def test_queueing_does_not_overwrite_an_existing_secret(kube):
+    name = f"app-{uuid.uuid4().hex[:8]}"
+    main._queue_application(_app_data(name))
+    other = _app_data(name)
+    other.Envs[0].Value = "changed"
+    with pytest.raises(ApiException) as e:
+        main._queue_application(other)
+    assert e.value.status == 409
+    assert kube.get("secrets", "default", f"{name}-secret")[1]["data"] == {"TOKEN": "aHVudGVyMg=="}
+
+
+def test_conflict_on_create_is_not_retried():
+    assert not main._is_retryable(ApiException(status=409))
+    assert main._is_retryable(ApiException(status=503))
@@ -0,0 +1,80 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def _mb(value):
+    assert value.endswith("MB")
+    return int(value[:-2])
+
+
+@pytest.mark.parametrize("storage", ["64Mi", "256Mi", "511Mi", "1Gi"])
+def test_small_storage_keeps_wal_sizes_postgres_accepts(storage):
+    tuning = main._postgres_tuning({"cpu": "250m", "memory": "256Mi"}, "mixed", storage)
+
+    assert _mb(tuning["min_wal_size"]) >= 32
+    assert _mb(tuning["max_wal_size"]) >= 2 * _mb(tuning["min_wal_size"])
+
+
+def test_large_storage_keeps_profile_wal_sizes():
+    tuning = main._postgres_tuning({"cpu": "4", "memory": "16Gi"}, "oltp", "500Gi")
+
+    assert tuning["min_wal_size"] == "2048MB"
+    assert tuning["max_wal_size"] == "8192MB"
+
+
+def test_storage_caps_max_wal_size_to_a_quarter_of_the_volume():
+    tuning = main._postgres_tuning({"cpu": "2", "memory": "4Gi"}, "mixed", "8Gi")
+
+    assert tuning["max_wal_size"] == "2048MB"
+    assert tuning["min_wal_size"] == "512MB"
+
+
+def test_memory_sizes_follow_pgtune():
+    tuning = main._postgres_tuning({"cpu": "2", "memory": "4Gi"})
+
+    assert tuning["shared_buffers"] == "1024MB"
+    assert tuning["effective_cache_size"] == "3072MB"
+    assert tuning["maintenance_work_mem"] == "256MB"
+    assert tuning["max_parallel_workers"] == 2
+    assert tuning["max_parallel_workers_per_gather"] == 1
+
+
+@pytest.mark.parametrize("profile, connections, statistics_target", [
+    ("web", 200, 100),
+    ("oltp", 300, 100),
+    ("dw", 40, 500),
+    ("mixed", 100, 100),
+])
+def test_profile_sets_connections_and_statistics_target(profile, connections, statistics_target):
+    tuning = main._postgres_tuning({"cpu": "2", "memory": "4Gi"}, profile)
+
+    assert tuning["max_connections"] == connections
+    assert tuning["default_statistics_target"] == statistics_target
+
+
+def test_mixed_profile_halves_work_mem():
+    resources = {"cpu": "2", "memory": "4Gi"}
+    web = main._postgres_tuning(resources, "web")
+    mixed = main._postgres_tuning(resources, "mixed")
+
+    # mixed allows half the connections of web, so before halving its work_mem would be twice as large.
+    assert mixed["work_mem"] == web["work_mem"]
+
+
+@pytest.mark.parametrize("resources, storage", [
+    ({"memory": "4Gi"}, None),
+    ({"cpu": "2"}, None),
+    ({"cpu": "two", "memory": "4Gi"}, None),
+    ({"cpu": "0", "memory": "4Gi"}, None),
+    ({"cpu": "2", "memory": "4Gi"}, "lots"),
+])
+def test_bad_quantities_are_rejected_up_front(resources, storage):
+    with pytest.raises(main.ValidationError):
+        main.PostgresAppData(AppName="db", Resources=resources, Storage=storage)
+
+
+def test_post_with_bad_quantities_returns_422():
+    response = TestClient(main.app).post("/postgres", json={"AppName": "db", "Resources": {"memory": "4Gi"}})
+    assert response.status_code == 422